@@ -1,15 +1,34 @@
 #!/usr/bin/env python3
-import sys
+import os
 import re
+import sys
+import time
+import html
+import functools
+import multiprocessing
+from optparse import OptionParser
 from os.path import basename, splitext
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+
+from pagestore import PageStore
+
+# Only the article itself is parsed out of each page. The rest of the page
+# (navigation, scripts, related content) is skipped over by the parser
+article_only = SoupStrainer("div", {"id":"biography_details2"})
+
+# Character normalisation of 02_extract/fix.py, imported from there so both
+# steps always normalise the same way. Applying it here lets a page be cleaned
+# and normalised in a single pass. The directory goes at the end of the path
+# so modules of this one are still found first
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "02_extract"))
+from fix import normalize
 
 def get_article(fname):
     with open(fname,"r") as f:
-        html = f.read()
-    
-    soup = BeautifulSoup(html, "lxml")
-    output = BeautifulSoup("<html><head><meta charset=\"UTF-8\"</head><body></body></html", "lxml")
+        return clean_article(f.read())
+
+def clean_article(page):
+    soup = BeautifulSoup(page, "lxml", parse_only=article_only)
 
     message_body = soup.find("div", {"id":"biography_details2"})
     article = message_body.find( "div", {"class" : "body"} )
@@ -17,30 +36,105 @@ def get_article(fname):
     title = article.find("h1")
     author = article.find("h5")
 
-    head_title = output.new_tag("title")
-    output.find("head").insert(0,head_title)
-    head_title.string = title.getText()   
-    
-    head_meta_author = output.new_tag("meta", author=re.sub("^by ", "", author.getText()))
-    output.find("head").append(head_meta_author)
+    head = "<title>{}</title><meta charset=\"UTF-8\"/>".format(html.escape(title.getText(), quote=False))
+    head += "<meta author=\"{}\"/>".format(html.escape(re.sub("^by ", "", author.getText())))
     title.decompose()
     author.decompose()
 
     for div in article.find_all("div", {"id" : "footnotes"}):
         div.decompose()
 
-    output.find("body").contents = article.contents
+    body = "".join( str(element) for element in article.contents )
+
+    return "<html><head>{}</head><body>{}</body></html>".format(head, body)
+
+# Page store opened by each worker process the first time it needs a page
+store = None
+
+# Cleans a single page and writes it to the output directory. `page` is a file
+# name, or the ID of an article in the page store when one is given. Returns
+# the article ID and, if the page could not be cleaned, why not. One bad page
+# is reported rather than stopping the run
+def process_page(output, store_path, fix, page):
+    global store
+
+    try:
+        if store_path == None:
+            article_id = splitext(basename(page))[0]
+            article = get_article(page)
+        else:
+            if store == None:
+                store = PageStore(store_path)
+            article_id = page
+            article = clean_article(store.get(page))
+    except AttributeError:
+        return article_id, "no article found"
+    except (OSError, KeyError, UnicodeDecodeError) as e:
+        return article_id, str(e)
+
+    if fix:
+        article = normalize(article)
+
+    with open(os.path.join(output, "{}.html".format(article_id)), "w") as f:
+        f.write(article)
+
+    return article_id, None
+
+# Cleans the pages in a pool of worker processes, or in this one if only one
+# process is asked for, yielding the results as they finish
+def clean_pages(clean, pages, processes):
+    if processes < 2:
+        yield from map(clean, pages)
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            yield from pool.imap_unordered(clean, pages, chunksize=16)
+
+def main():
+    parser = OptionParser(usage="usage: %prog [options] FILE ...")
+
+    parser.add_option("-o", "--output",
+        action="store", type="string", dest="output", default=".",
+        help="directory to which the cleaned articles should be written"
+    )
+
+    parser.add_option("-p", "--processes",
+        action="store", type="int", dest="processes", default=4,
+        help="number of parallel processes to use for cleaning"
+    )
+
+    parser.add_option("-f", "--fix",
+        action="store_true", dest="fix", default=False,
+        help="also apply the character normalisation done by 02_extract/fix.py"
+    )
+
+    parser.add_option("-s", "--store",
+        action="store", type="string", dest="store", default=None,
+        help="read the pages from this page store rather than from files"
+    )
+
+    options, args = parser.parse_args()
+
+    # With a page store, the arguments pick out the articles to process. All
+    # pages in the store are used when none are given
+    pages = args
+    if options.store != None and len(pages) == 0:
+        pages = PageStore(options.store).keys()
+
+    os.makedirs(options.output, exist_ok=True)
+    clean = functools.partial(process_page, options.output, options.store, options.fix)
 
-    return output
+    start = time.time()
 
-def main(arg):
-    for i in range(len(arg)):
-        page = arg[i]
-        print("Processing {:4}/{} :: {}".format(i+1, len(arg), page))
-        article = get_article(page)
-        with open("{}.html".format(splitext(basename(page))[0]), "w") as f:
-            f.write(str(article))
+    failed = 0
+    for i, (article_id, error) in enumerate(clean_pages(clean, pages, options.processes)):
+        if error != None:
+            failed += 1
+            print("Failed     {:4}/{} :: {} ({})".format(i+1, len(pages), article_id, error))
+        else:
+            print("Processing {:4}/{} :: {}".format(i+1, len(pages), article_id))
 
+    elapsed = time.time() - start
+    print("Cleaned {} pages in {:.1f}s ({:.1f} pages/sec), {} failed".format(len(pages) - failed, elapsed, len(pages) / elapsed if elapsed > 0 else 0, failed))
 
 if __name__=="__main__":
-    main(sys.argv[1:])
+    main()
@@ -1,49 +1,120 @@
 #!/usr/bin/env python3
-import random
+import sys
 import urllib.parse
-import urllib.request
-from bs4 import BeautifulSoup
+from optparse import OptionParser
+from bs4 import BeautifulSoup, SoupStrainer
+
+from metrics import CrawlMetrics
+from fetcher import FetchEngine
+from harvest import LinkWriter
 
 seed = "http://dib.cambridge.org/browse.do"
 
-def scrape(root):
-    
-    links = []
-    pf = 1
-    pl = 105
-    for i in range(pf,pl+1):
-        print("Page {}/{}".format(i,pl))
-
-        args = {
-            "searchBy": "1",
-            "_currentPage" : i,
-            "_pageSize" : "100",
-            "_sortBy" : "name",
-            "_sortOrder" : "asc"
-        }
-
-        query_string = urllib.parse.urlencode(args)
-        url = "{}?{}".format(root, query_string)
-        
-        try:
-            req = urllib.request.Request(url)
-            handler = urllib.request.urlopen( req )        
-            page = handler.read().decode( 'utf-8' )
-            soup = BeautifulSoup(page, "html.parser")
-            search_results = soup.find("div", {"class" : "text_04"})
-            for link in search_results.find_all("a"):
-                links.append(str(link))
-                
-        except urllib.error.HTTPError as e:
-            print(e)
-
-    return links
+# Only the search results are parsed out of each listing page
+search_results = SoupStrainer("div", {"class" : "text_04"})
+
+def page_url(root, i):
+    args = {
+        "searchBy": "1",
+        "_currentPage" : i,
+        "_pageSize" : "100",
+        "_sortBy" : "name",
+        "_sortOrder" : "asc"
+    }
+
+    query_string = urllib.parse.urlencode(args)
+    return "{}?{}".format(root, query_string)
+
+def parse_links(page):
+    soup = BeautifulSoup(page, "lxml", parse_only=search_results)
+    results = soup.find("div", {"class" : "text_04"})
+    if results == None:
+        return []
+    return [ str(link) for link in results.find_all("a") ]
+
+def scrape(root, options):
+    pf = options.first
+    pl = options.last
+
+    engine = FetchEngine(
+        concurrency = options.concurrency,
+        rate        = options.rate,
+        metrics     = CrawlMetrics(options.metrics, options.metrics_interval)
+    )
+
+    with open(options.output, "w") as f:
+        writer = LinkWriter(f, pf)
+        failures = []
+
+        def save(i, url, page):
+            print("Page {}/{}".format(i,pl))
+            writer.put(i, parse_links(page.content))
+
+        # Failed pages are left out of the links file rather than written as
+        # pages without links, and reported once the harvest is over
+        def failed(i, url, error):
+            failures.append(i)
+            writer.skip(i)
+
+        engine.run(( (i, page_url(root, i)) for i in range(pf,pl+1) ), save, failed)
+
+    print("{} links written to {}".format(writer.written, options.output))
+    return sorted(failures)
+
+def process_args():
+    parser = OptionParser(usage="usage: %prog [options]")
+
+    parser.add_option("-o", "--output",
+        action="store", type="string", dest="output", default="links.txt",
+        help="file to which the links should be written"
+    )
+
+    parser.add_option("-c", "--concurrency",
+        action="store", type="int", dest="concurrency", default=32,
+        help="maximum number of listing pages requested at once. The number actually in flight adapts to how the server is coping"
+    )
+
+    parser.add_option("-r", "--rate",
+        action="store", type="float", dest="rate", default=0,
+        help="maximum number of requests per second sent to the site (0 for no fixed cap)"
+    )
+
+    parser.add_option("--first",
+        action="store", type="int", dest="first", default=1,
+        help="first listing page to harvest"
+    )
+
+    parser.add_option("--last",
+        action="store", type="int", dest="last", default=105,
+        help="last listing page to harvest"
+    )
+
+    parser.add_option("--root",
+        action="store", type="string", dest="root", default=seed,
+        help="listing from which the links are harvested"
+    )
+
+    parser.add_option("-m", "--metrics",
+        action="store", type="string", dest="metrics", default=None,
+        help="file to which crawl metrics are appended as lines of JSON"
+    )
+
+    parser.add_option("--metrics-interval",
+        action="store", type="float", dest="metrics_interval", default=60,
+        help="seconds between metrics snapshots"
+    )
+
+    options, args = parser.parse_args()
+    return options, args
 
 def main():
-    links = set(scrape(seed))
+    options, args = process_args()
+    failures = scrape(options.root, options)
 
-    with open("links.txt", "w") as f:
-        f.write("\n".join(links))
+    if len(failures) > 0:
+        print("Listing pages {} could not be fetched and their links are missing from {}. Harvest them again with --first and --last".format(
+            ", ".join(str(i) for i in failures), options.output), file=sys.stderr)
+        sys.exit(1)
 
 if __name__=="__main__":
     main()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+import time
+import random
+import asyncio
+import urllib.parse
+from collections import namedtuple
+
+import aiohttp
+
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_9_3) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/35.0.1916.47 Safari/537.36'
+
+# Result of a fetch. `content` is None when the server answered a conditional
+# request with 304 Not Modified, in which case the copy we already have is
+# still current. The validators are kept so the next crawl can ask again
+Page = namedtuple("Page", ["content", "etag", "last_modified"])
+
+# Seconds to wait before retrying a page that failed for a reason that may go
+# away on its own (throttling, server errors, dropped connections)
+RETRY_DELAY = 60
+
+# Pages that fail with a temporary error are retried during the crawl this
+# many times, waiting twice as long each time, before being given up on
+RETRIES       = 5
+BACKOFF       = 2.0
+BACKOFF_LIMIT = 300.0
+
+def is_throttled(status):
+    return status == 429 or status >= 500
+
+def retry_after(error):
+    if isinstance(error, aiohttp.ClientResponseError) and error.headers != None:
+        value = error.headers.get("Retry-After")
+        if value != None and value.isdigit():
+            return int(value)
+    return None
+
+# Errors worth retrying later return the number of seconds to wait. Errors that
+# will not go away (404 and friends) return None
+def retry_delay(error):
+    if isinstance(error, aiohttp.ClientResponseError):
+        if not is_throttled(error.status):
+            return None
+
+        delay = retry_after(error)
+        return delay if delay != None else RETRY_DELAY
+
+    if isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError)):
+        return RETRY_DELAY
+
+    return None
+
+# Seconds to wait before the given retry of a page
+def backoff(attempt, error):
+    delay = min(BACKOFF_LIMIT, BACKOFF * 2 ** attempt) * random.uniform(0.5, 1.0)
+    server_delay = retry_after(error)
+    return max(delay, server_delay) if server_delay != None else delay
+
+# Spaces out the requests made against each host so that no more than `rate`
+# requests per second are started against any one of them. A rate of 0 puts
+# no fixed cap on requests, leaving the pace to the AdaptiveLimit
+class HostRateLimiter:
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0
+        self.next_slot = {}
+
+    async def wait(self, host):
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self.next_slot.get(host, now))
+        self.next_slot[host] = slot + self.interval
+
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    # Holds back every request to a host, e.g. for a 429's Retry-After
+    def pause(self, host, delay):
+        now = asyncio.get_running_loop().time()
+        self.next_slot[host] = max(self.next_slot.get(host, now), now + delay)
+
+# Additive increase / multiplicative decrease control of the number of
+# requests in flight. Every healthy response lets the limit grow by about one
+# request per round of requests. Throttling (429), server errors, dropped
+# connections and responses much slower than usual cut it by `decrease`, at
+# most once per round so a burst of failures only counts once
+class AdaptiveLimit:
+    def __init__(self, maximum, initial=2, minimum=1, increase=1.0,
+            decrease=0.5, spike=3.0):
+        self.maximum   = maximum
+        self.minimum   = minimum
+        self.limit     = float(max(minimum, min(initial, maximum)))
+        self.increase  = increase
+        self.decrease  = decrease
+        self.spike     = spike
+        self.in_flight = 0
+        self.latency   = None
+        self.cut       = 0
+        self.condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, healthy, latency):
+        async with self.condition:
+            self.in_flight -= 1
+
+            # Latency spikes only count against well established baselines, and
+            # never for requests that are quick in absolute terms
+            slow = self.latency != None and latency > max(0.5, self.spike * self.latency)
+
+            if healthy and not slow:
+                self.latency = latency if self.latency == None else 0.9 * self.latency + 0.1 * latency
+                self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+            else:
+                now = asyncio.get_running_loop().time()
+                if now - self.cut > (self.latency or 1.0):
+                    self.cut = now
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+
+            self.condition.notify_all()
+
+# Asynchronous page fetcher. A pool of workers pull (key, url) pairs from a
+# bounded queue and share a single keep-alive connection pool, so connections
+# to a host are reused rather than opened for every page. The number of
+# requests actually in flight is set by an AdaptiveLimit, up to `concurrency`.
+# Each page is handed to the callback, which can be a coroutine function, as
+# soon as it arrives so it can be written out while the rest of the crawl
+# carries on. Pages that fail with a temporary error go back on the queue
+# after an exponential backoff. Only pages that fail for good, or run out of
+# retries, are passed to `on_error`
+class FetchEngine:
+    def __init__(self, concurrency=32, per_host=32, rate=0, timeout=60,
+            method="GET", data=None, headers=None, retries=RETRIES, metrics=None):
+        self.concurrency = concurrency
+        self.per_host    = per_host
+        self.rate        = rate
+        self.timeout     = aiohttp.ClientTimeout(total=timeout)
+        self.method      = method
+        self.data        = data
+        self.headers     = headers if headers != None else { 'User-Agent' : USER_AGENT }
+        self.retries     = retries
+        self.metrics     = metrics
+
+    # `validators` holds the ETag / Last-Modified values seen the last time the
+    # page was fetched, if any. When given, the server only sends the page
+    # again if it has changed since. Validators only mean that for GET
+    # (RFC 7232): a server answers a matching If-None-Match on a POST with 412
+    # and ignores If-Modified-Since, so conditional requests are always GETs
+    async def fetch(self, session, url, validators=None):
+        method, data = self.method, self.data
+        headers = {}
+        if validators != None:
+            method, data = "GET", None
+            etag, last_modified = validators
+            if etag != None:
+                headers["If-None-Match"] = etag
+            if last_modified != None:
+                headers["If-Modified-Since"] = last_modified
+
+        async with session.request(method, url, data=data, headers=headers) as response:
+            body = await response.read()
+            if self.metrics != None:
+                self.metrics.add_bytes(len(body))
+            response.raise_for_status()
+
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+
+            if response.status == 304:
+                return Page(None, etag or validators[0], last_modified or validators[1])
+
+            return Page(body.decode('utf-8'), etag, last_modified)
+
+    async def __controlled_fetch(self, session, url, validators):
+        host = urllib.parse.urlsplit(url).netloc
+        await self.control.acquire()
+        healthy = True
+        status = None
+        start = time.monotonic()
+        try:
+            await self.limiter.wait(host)
+            start = time.monotonic()
+            page = await self.fetch(session, url, validators)
+            status = 200 if page.content != None else 304
+            return page
+        except aiohttp.ClientResponseError as e:
+            status = e.status
+            healthy = not is_throttled(e.status)
+            if e.status == 429 and retry_after(e) != None:
+                self.limiter.pause(host, retry_after(e))
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            status = type(e).__name__
+            healthy = False
+            raise
+        finally:
+            latency = time.monotonic() - start
+            if self.metrics != None and status != None:
+                self.metrics.record(status, latency)
+            await self.control.release(healthy, latency)
+
+    async def __retry_later(self, queue, task, delay):
+        await asyncio.sleep(delay)
+        await queue.put(task)
+        # Only now is the failed attempt finished, so the queue never looks
+        # empty while a retry is waiting
+        queue.task_done()
+
+    async def __worker(self, session, queue, on_page, on_error, validators):
+        while True:
+            key, url, attempt = await queue.get()
+            try:
+                page = await self.__controlled_fetch(session, url, validators(key) if validators != None else None)
+            except (aiohttp.ClientError, asyncio.TimeoutError, UnicodeDecodeError) as e:
+                if retry_delay(e) != None and attempt < self.retries:
+                    delay = backoff(attempt, e)
+                    print("{} {} (retrying in {:.0f}s)".format(e, url, delay))
+                    retry = asyncio.create_task(self.__retry_later(queue, (key, url, attempt + 1), delay))
+                    retry.add_done_callback(self.retrying.discard)
+                    self.retrying.add(retry)
+                    continue
+
+                print(e, url)
+                if on_error != None:
+                    on_error(key, url, e)
+                queue.task_done()
+                continue
+
+            # A coroutine callback is awaited, so it can hand slow work on the
+            # page (parsing it, say) to an executor without holding up the
+            # event loop
+            saved = on_page(key, url, page)
+            if asyncio.iscoroutine(saved):
+                await saved
+            queue.task_done()
+
+    def __state(self, queue):
+        return {
+            "queue_depth" : queue.qsize(),
+            "retrying"    : len(self.retrying),
+            "in_flight"   : self.control.in_flight,
+            "limit"       : round(self.control.limit, 1)
+        }
+
+    async def __report(self, queue):
+        while True:
+            await asyncio.sleep(1)
+            if self.metrics.due():
+                self.metrics.snapshot(**self.__state(queue))
+
+    async def __produce(self, tasks, queue):
+        for key, url in tasks:
+            await queue.put((key, url, 0))
+        await queue.join()
+
+    async def crawl(self, tasks, on_page, on_error=None, validators=None):
+        self.limiter  = HostRateLimiter(self.rate)
+        self.control  = AdaptiveLimit(self.concurrency)
+        self.retrying = set()
+
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host)
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)
+
+        async with aiohttp.ClientSession(connector=connector, headers=self.headers, timeout=self.timeout) as session:
+            workers = [ asyncio.create_task(self.__worker(session, queue, on_page, on_error, validators)) for _ in range(self.concurrency) ]
+            producer = asyncio.create_task(self.__produce(tasks, queue))
+            background = [ asyncio.create_task(self.__report(queue)) ] if self.metrics != None else []
+
+            # Workers only ever stop by raising, in which case the crawl stops
+            # with them rather than waiting on a queue nobody is emptying
+            done, _ = await asyncio.wait(workers + [producer], return_when=asyncio.FIRST_COMPLETED)
+
+            for task in workers + [producer] + background + list(self.retrying):
+                task.cancel()
+            await asyncio.gather(*workers, producer, *background, *self.retrying, return_exceptions=True)
+
+            for task in done:
+                task.result()
+
+            if self.metrics != None:
+                self.metrics.print_summary(self.metrics.summary(**self.__state(queue)))
+
+    def run(self, tasks, on_page, on_error=None, validators=None):
+        asyncio.run(self.crawl(tasks, on_page, on_error, validators))
@@ -1,19 +1,18 @@
 #!/usr/bin/env python3
-import os
 import sys
 
-def load_links(fname):
-    with open(fname,"r") as f:
-        return f.read().split("\n")[:-1]
-
-def load_articles(dirname):
-    files = os.listdir(dirname)
-    return [ os.path.splitext(os.path.basename(f))[0] for f in files ]
+from frontier import CrawlFrontier
 
+# Lists every page in the crawl state kept by scrape.py that has not been
+# fetched, by article ID
 def main(args):
-    links = sorted(load_links(args[0]))
-    files = load_articles(args[1])
-    missing = [ link for link in links if link not in files ]
+    if len(args) != 1:
+        print("usage: id_missing_pages.py CRAWL_DB", file=sys.stderr)
+        sys.exit(2)
+
+    frontier = CrawlFrontier(args[0])
+    missing = frontier.missing()
+    frontier.close()
     print("\n".join(missing))
 
 if __name__=="__main__":
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+import sys
+import json
+import time
+import bisect
+from collections import Counter
+
+# Upper bounds, in milliseconds, of the buckets of the latency histogram. The
+# last bucket takes everything slower
+LATENCY_BUCKETS = [ 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000 ]
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total  = 0
+        self.sum    = 0.0
+        self.max    = 0.0
+
+    def add(self, ms):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, ms)] += 1
+        self.total += 1
+        self.sum   += ms
+        self.max    = max(self.max, ms)
+
+    # Upper bound of the bucket holding the given percentile
+    def percentile(self, p):
+        if self.total == 0:
+            return None
+
+        rank = p / 100.0 * self.total
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS + [self.max], self.counts):
+            seen += count
+            if seen >= rank:
+                return round(min(bound, self.max), 1)
+        return round(self.max, 1)
+
+    def summary(self):
+        return {
+            "count" : self.total,
+            "mean"  : round(self.sum / self.total, 1) if self.total > 0 else None,
+            "p50"   : self.percentile(50),
+            "p90"   : self.percentile(90),
+            "p99"   : self.percentile(99),
+            "max"   : round(self.max, 1),
+            "buckets" : { "<={}".format(b) : c for b, c in zip(LATENCY_BUCKETS, self.counts) if c > 0 },
+            "slower" : self.counts[-1]
+        }
+
+# Counters kept over the whole of a crawl. Every `interval` seconds a snapshot
+# is written as one line of JSON, covering the crawl so far and the requests
+# made since the last snapshot. This shows when the site starts throttling or
+# slowing down. A summary of the whole crawl is written once it finishes
+class CrawlMetrics:
+    def __init__(self, output=None, interval=60):
+        self.output   = output
+        self.interval = interval
+        self.start    = time.time()
+        self.requests = 0
+        self.pages    = 0
+        self.bytes    = 0
+        self.statuses = Counter()
+        self.errors   = Counter()
+        self.latency  = LatencyHistogram()
+        self.window   = LatencyHistogram()
+        self.window_start = self.start
+        self.window_pages = 0
+        self.window_bytes = 0
+
+    # `status` is the HTTP status code, or the name of the exception for
+    # requests that never got a response
+    def record(self, status, latency):
+        ms = latency * 1000
+        self.requests += 1
+        self.statuses[status] += 1
+        self.latency.add(ms)
+        self.window.add(ms)
+
+        if isinstance(status, int) and status < 400:
+            self.pages += 1
+            self.window_pages += 1
+        else:
+            self.errors[status] += 1
+
+    def add_bytes(self, n):
+        self.bytes += n
+        self.window_bytes += n
+
+    def due(self):
+        return time.time() - self.window_start >= self.interval
+
+    def snapshot(self, **state):
+        now = time.time()
+        window = now - self.window_start
+        elapsed = now - self.start
+
+        record = {
+            "time"          : round(now, 3),
+            "elapsed"       : round(elapsed, 1),
+            "requests"      : self.requests,
+            "pages"         : self.pages,
+            "bytes"         : self.bytes,
+            "pages_per_sec" : round(self.window_pages / window, 2) if window > 0 else 0,
+            "bytes_per_sec" : round(self.window_bytes / window, 1) if window > 0 else 0,
+            "errors"        : { str(k) : v for k, v in self.errors.items() },
+            "latency_ms"    : self.window.summary()
+        }
+        record.update(state)
+
+        self.window = LatencyHistogram()
+        self.window_start = now
+        self.window_pages = 0
+        self.window_bytes = 0
+
+        self.__write(record)
+        return record
+
+    def summary(self, **state):
+        elapsed = time.time() - self.start
+        record = {
+            "summary"       : True,
+            "elapsed"       : round(elapsed, 1),
+            "requests"      : self.requests,
+            "pages"         : self.pages,
+            "bytes"         : self.bytes,
+            "pages_per_sec" : round(self.pages / elapsed, 2) if elapsed > 0 else 0,
+            "bytes_per_sec" : round(self.bytes / elapsed, 1) if elapsed > 0 else 0,
+            "statuses"      : { str(k) : v for k, v in self.statuses.items() },
+            "errors"        : { str(k) : v for k, v in self.errors.items() },
+            "latency_ms"    : self.latency.summary()
+        }
+        record.update(state)
+
+        self.__write(record)
+        return record
+
+    def __write(self, record):
+        if self.output == None:
+            return
+        with open(self.output, "a") as f:
+            f.write("{}\n".format(json.dumps(record)))
+
+    def print_summary(self, record, f=sys.stdout):
+        latency = record["latency_ms"]
+        print("{} requests, {} pages, {:.1f} MB in {:.0f}s ({} pages/sec)".format(
+            record["requests"], record["pages"], record["bytes"] / 1e6, record["elapsed"], record["pages_per_sec"]), file=f)
+        if latency["count"] > 0:
+            print("latency ms: mean {} p50 {} p90 {} p99 {} max {}".format(
+                latency["mean"], latency["p50"], latency["p90"], latency["p99"], latency["max"]), file=f)
+        if len(record["errors"]) > 0:
+            print("errors: {}".format(", ".join("{} x{}".format(k, v) for k, v in sorted(record["errors"].items()))), file=f)
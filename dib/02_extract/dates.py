@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+import re
+import sys
+import functools
+from collections import namedtuple
+
+# Parses the life dates given in brackets at the start of an article, such as
+# "c.1600-1650", "d. 1432" or "fl. 1250×1260". The same few forms of date turn
+# up across tens of thousands of articles, so each worker process remembers
+# what every one it has seen came out as. ODNB and DIB both use this
+
+# Bracketed text ending in a digit. The first one in the first paragraph of an
+# article holds the life dates
+life_dates = re.compile(r"(?<=\()([^\)]*[0-9])")
+
+year  = re.compile(r"[0-9/]+")
+years = re.compile(r"/|×")
+fuzzy = re.compile(r"c\.|f\.|fl\.|a\.|/|×|\?|p\.")
+
+LifeDates = namedtuple("LifeDates", [
+    "born", "died",
+    "born_low", "born_high",
+    "died_low", "died_high",
+    "floruit_low", "floruit_high",
+    "fuzzy"
+])
+
+CACHE_SIZE = 1 << 16
+
+# The earliest and latest year a date could be. "1250/1260" is 1250 to 1260
+# and "1698/9" is 1698 to 1699. -1, -1 if there is no year in it at all
+def parse_date_part(date_part):
+    date = year.search(date_part)
+    if date == None:
+        return -1, -1
+
+    date = years.split(date.group())
+
+    date_low = date[0]
+    date_high = date[-1]
+
+    diff = len(date_low)-len(date_high)
+    date_high = date_low[:diff] + date_high
+
+    return int(date_low), int(date_high)
+
+# Death dates may leave out the century, as in "1598-99"
+def fix_century(date_low, date_high):
+    if date_high < date_low:
+        date_high += (date_low//100)*100
+    return date_high
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def parse(text):
+    born = died = -1
+    born_low = born_high = died_low = died_high = -1
+    floruit_low = floruit_high = -1
+
+    dates = text.split("-")
+
+    if len(dates) > 1:
+        born, died = dates[0], dates[1]
+        born_low, born_high = parse_date_part(born)
+        died_low, died_high = parse_date_part(died)
+
+        died_low  = fix_century(born_low, died_low)
+        died_high = fix_century(born_high, died_high)
+    else:
+        if "d." in dates[0]:
+            died_low, died_high = parse_date_part(dates[0])
+        else:
+            born_low, born_high = parse_date_part(dates[0])
+
+    # Single figures are centuries, "fl. 12" being the twelfth century
+    if died_low > 0 and died_low <= 10:
+        died_low     = (died_low - 1) * 100
+        died_high    = died_low + 100
+        floruit_low  = died_low
+        floruit_high = died_high
+
+    if born_low > 0 and born_low <= 10:
+        born_low     = (born_low - 1) * 100
+        born_high    = born_low + 100
+        floruit_low  = born_low
+        floruit_high = born_high
+
+    return LifeDates(
+        born, died,
+        born_low, born_high,
+        died_low, died_high,
+        floruit_low, floruit_high,
+        fuzzy.search(text) != None
+    )
+
+# Life dates found in the given text, or None if it has none
+def find(text):
+    match = life_dates.search(text)
+    if match == None:
+        return None
+    return parse(match.group())
+
+# Prints how each argument is parsed, as a quick way of checking the parser
+if __name__ == "__main__":
+    for arg in sys.argv[1:]:
+        print("{:<24} | {}".format(arg, parse(arg)))
@@ -1,22 +1,28 @@
 #!/usr/bin/env python3
 
 import re
-import math
-import json
+import time
 import logging
 import itertools
 import urllib.parse
-import networkx as nx
-from bs4 import BeautifulSoup
 from os.path import basename, splitext
-from pyjarowinkler.distance import get_jaro_distance
-from config import HONORIFICS, TITLES, LOCATIONS, NORMALS
+import fix
+import names
+import dates
+import parsers
+
+# Articles kept in files are named after their article IDs
+def file_article_id(fname):
+    return splitext(basename(fname))[0]
 
 class Entity:
     
-    def __init__(self, fname):       
+    # Builds the entity for an article from its HTML, as text or UTF-8 bytes,
+    # and its article ID. `name` is what the article is called in the logs,
+    # the article ID if not given
+    def __init__(self, html, article_id, parser=parsers.DEFAULT_PARSER, max_labels=None, profile=False, normalize=False, name=None):
         # Initialize everything that this class is going to try to extract
-        self.fname           = fname # Name of the file being processed
+        self.name            = name if name != None else article_id # Name of the article being processed
         self.title           = ""    # Title of the article     
         self.article_id      = ""    # ID of article on Dictionary site
         self.article_links   = []    # Anchor tags in the body of the article
@@ -43,22 +49,58 @@ class Entity:
         self.first_paragraph = ""
         self.pos_tags        = []
         self.chunks          = []
+        self.timings         = {} if profile else None # Seconds spent in each stage
         
         self.__info("Processing")
 
-        soup = self.__fname2soup(fname)
+        if isinstance(html, bytes):
+            html = self.__timed("decode", html.decode, "utf-8")
+        # The character normalisation of fix.py, so a fixed copy of the pages
+        # doesn't have to be written out first
+        if normalize:
+            html = self.__timed("normalize", fix.normalize, html)
+        article = self.__timed("parse", parsers.PARSERS[parser], html)
         
-        self.__extract_article_id()
-        self.__extract_title(soup)
-        self.__extract_links(soup)
-        self.__extract_text_extracts(soup)
-        self.__extract_born_death_dates()
-        self.__extract_names()
+        self.__timed("article_id", self.__extract_article_id, article_id)
+        self.__timed("title", self.__extract_title, article)
+        self.__timed("links", self.__extract_links, article)
+        self.__timed("text_extracts", self.__extract_text_extracts, article)
+        self.__timed("born_death_dates", self.__extract_born_death_dates)
+        self.__timed("names", self.__extract_names)
+        self.__timed("name_parts", self.__extract_name_parts)
+
+        self.labels = self.__timed("name_permutations", self.__generate_name_permutations, self.title, max_labels)
+
+        self.__timed("location", self.__extract_location)
+
+    # Reads the article from a file and builds its entity, taking the article
+    # ID from the file name. Takes the same keyword options as the constructor
+    @classmethod
+    def from_file(cls, fname, **options):
+        start = time.perf_counter()
+        with open(fname, "r") as f:
+            html = f.read()
+        elapsed = time.perf_counter() - start
+
+        entity = cls(html, file_article_id(fname), name=fname, **options)
+        if entity.timings != None:
+            entity.timings["read_file"] = elapsed
+        return entity
 
+    # Runs one stage of the extraction, noting how long it took if profiling
+    def __timed(self, stage, extract, *args):
+        if self.timings == None:
+            return extract(*args)
+
+        start = time.perf_counter()
+        result = extract(*args)
+        self.timings[stage] = time.perf_counter() - start
+        return result
+
+    def __extract_name_parts(self):
         corrected_name = re.sub(r"\s+", " ", " ".join(re.compile(r",(?![^\(]+\))").split(self.title, 1)[::-1]).strip())
         corrected_name = re.sub("\s+", " ", re.sub(r"\([^\)]+\)", "", corrected_name)).strip()
         self.given_name = corrected_name
-        # self.__transform_and_append(name, self.labels)
 
         nameparts = self.__apply_normalization_patterns(corrected_name)
         nameparts = self.__collapse_locations(nameparts)
@@ -76,20 +118,15 @@ class Entity:
 
         self.nameparts = nameparts
 
-        self.labels = self.__generate_name_permutations(self.title)
-
+    def __extract_location(self):
         self.location = ""
-        for pattern in LOCATIONS:
-            location = re.search(pattern, self.title)
+        for pattern in names.location_patterns:
+            location = pattern.search(self.title)
             if location != None:
                 self.location = location.group(0)[3:]
     
-    def __fname2soup(self, fname):
-        with open(fname, "r") as f:
-            return BeautifulSoup(f.read(), "lxml")
-
-    def __generate_name_permutations(self, name):
-        permutations = []
+    def __generate_name_permutations(self, name, limit=None):
+        permutations = names.LabelSet(limit)
 
         nameparts = re.compile(r",(?![^\(]+\))").split(name, 1)[::-1]
         nameparts = [ part.strip() for part in nameparts ]
@@ -110,95 +147,57 @@ class Entity:
         alt_surnames.append(self.surname)
 
         self.nicknames = [ nickname[1:-1] for nickname in alt_forenames + alt_surnames if re.match(r"^[\"'].+[\"']$", nickname) ]
-        permutations += self.nicknames
+        permutations.extend(self.nicknames)
         alt_forenames = [ re.sub(r"^[\"']?([^'\"]+)[\"']?$", r"\1", altname.strip()) for altname in alt_forenames ]
         alt_surnames = [ re.sub(r"^[\"']?([^'\"]+)[\"']?$", r"\1", altname.strip()) for altname in alt_surnames ]
 
-        altnames = list(itertools.product(alt_forenames, alt_surnames))
+        # Only as many combinations as could still become labels are made
+        altnames = itertools.islice(itertools.product(alt_forenames, alt_surnames), limit)
         altnames = [ re.sub(r"\s+", " ", " ".join(altname).strip()) for altname in altnames ]
 
         name = re.sub(r"\s+", " ", " ".join(nameparts).strip())
         
-        self.__transform_and_append(name, permutations)
+        permutations.add(name)
         
         for altname in altnames:
-            self.__transform_and_append(altname, permutations)
+            permutations.add(altname)
 
-        self.__transform_and_append(
-            name, 
-            permutations, 
-            transf = lambda x: re.sub("\s+", " ", re.sub(r"\([^\)]+\)", "", name)).strip()
-        )
+        permutations.add(re.sub("\s+", " ", re.sub(r"\([^\)]+\)", "", name)).strip())
         
 
         #for perm in permutations:
-        #    self.__transform_and_append(
-        #        perm, 
-        #        permutations, 
-        #        transf = self.__apply_normalization_patterns
-        #    )   
+        #    permutations.add(self.__apply_normalization_patterns(perm))
 
         for perm in permutations:
             # collapse titles "Sir John of Kinsale" to "John of Kinsale"
-            self.__transform_and_append(
-                perm, 
-                permutations, 
-                transf = self.__collapse_titles_honorifics
-            )
+            permutations.add(self.__collapse_titles_honorifics(perm))
 
         for perm in permutations:
             # collapse locations "Sir John of Kinsale" to "Sir John"
-            self.__transform_and_append(
-                perm,
-                permutations,
-                transf = self.__collapse_locations
-            )
+            permutations.add(self.__collapse_locations(perm))
 
         # Filter permutations that are comprised only of titles or locations
-        permutations = [ permutation for permutation in permutations if not self.__matches_pattern_set(permutation, HONORIFICS) ]
-        permutations = [ permutation for permutation in permutations if not self.__matches_pattern_set(permutation, TITLES) ]
-        permutations = [ permutation for permutation in permutations if not self.__matches_pattern_set(permutation, LOCATIONS) ]
+        permutations = [ permutation for permutation in permutations.labels if not names.honorifics.match(permutation) ]
+        permutations = [ permutation for permutation in permutations if not names.titles.match(permutation) ]
+        permutations = [ permutation for permutation in permutations if not names.locations.match(permutation) ]
 
         return permutations
 
-    def __transform_and_append(self, label, permutations, transf = lambda x: x):
-        transformation = transf(label)
-        if transformation not in permutations and len(transformation) > 0:
-            permutations.append(transformation)
-
     def __apply_normalization_patterns( self, name ):
-        
-        for pattern, sub in NORMALS:            
-            newname = re.sub(pattern, sub, name)
-            #if name != newname:
-            #   self.__info("Normalizing '{}' : '{}'".format(name, newname))
-            name = newname
-
-        return name
+        return names.normalize(name)
 
     def __collapse_locations( self, name ):
-        for pattern in LOCATIONS:           
-            name = re.sub("\s+", " ", re.sub(pattern, "", name)).strip()
-
-        return name
+        return names.collapse_locations(name)
 
     def __collapse_titles_honorifics( self, name ):
-        nameparts = name.split(" ")
-        nameparts = [ part for part in nameparts if not self.__matches_pattern_set(part, HONORIFICS) ]
-        nameparts = [ part for part in nameparts if not self.__matches_pattern_set(part, TITLES) ]
-        return " ".join(nameparts)
-
-    def __matches_pattern_set( self, term, pattern_set ):
-        for pattern in pattern_set:
-            if re.match(pattern, term, re.IGNORECASE):
-                return True
-        return False
+        return names.collapse_titles_honorifics(name)
 
-    def __extract_article_id(self):
-        self.article_id = splitext(basename(self.fname))[0]
+    # The article ID is taken from the file name unless it is given
+    def __extract_article_id(self, article_id):
+        self.article_id = article_id
 
-    def __extract_title(self, soup):
-        self.title = self.__compress_space(soup.find("title").getText())
+    def __extract_title(self, article):
+        self.title = self.__compress_space(article.title)
 
         if len(self.title) < 1:
             self.__warn("Blank title")
@@ -245,69 +244,26 @@ class Entity:
             if len(s) > 0:
                 self.altnames.append(s)
 
-    def __parse_date_part(self, date_part):
-        date = re.search(r"[0-9/]+", date_part).group()
-        date = re.compile(r"/|×").split(date)
-
-        date_low = date[0]
-        date_high = date[-1]
-
-        diff = len(date_low)-len(date_high)
-        date_high = date_low[:diff] + date_high
-
-        return int(date_low), int(date_high)
-
-    def __fix_century(self, date_low, date_high):
-        if date_high < date_low:
-            date_high += (date_low//100)*100
-        return date_high
+    def __extract_born_death_dates(self):
+        life_dates = dates.find(self.first_paragraph)
 
-    def __extract_born_death_dates(self):                
-        match = re.search("(?<=\()([^\)]*[0-9])", self.first_paragraph)
-        
-        if match == None:            
+        if life_dates == None:
             return
 
-        dates = match.group().split("-")
-
-        if len(dates) > 1:
-            self.born, self.died = dates[0], dates[1]
-            self.born_low, self.born_high = self.__parse_date_part(self.born)
-            self.died_low, self.died_high = self.__parse_date_part(self.died)
-            
-            self.died_low  = self.__fix_century(self.born_low, self.died_low)
-            self.died_high = self.__fix_century(self.born_high, self.died_high)
-        else:            
-            if "d." in dates[0]:
-                self.died_low, self.died_high = self.__parse_date_part(dates[0])
-            else:
-                self.born_low, self.born_high = self.__parse_date_part(dates[0])           
-        
-        if self.died_low > 0 and self.died_low <= 10:
-            self.died_low = (self.died_low - 1) * 100
-            self.died_high = self.died_low + 100
-            self.floruit_low  = self.died_low
-            self.floruit_high = self.died_high
-
-        if self.born_low > 0 and self.born_low <= 10:
-            self.born_low     = (self.born_low - 1) * 100
-            self.born_high    = self.born_low + 100
-            self.floruit_low  = self.born_low
-            self.floruit_high = self.born_high
-
-        self.fuzzy = re.search( r"c\.|f\.|fl\.|a\.|/|×|\?|p\.", match.group() ) != None
-
-        print( "{:<24} | {:>4} | {:>4} | {:>4} | {:>4} | {:>4} | {} ".format(match.group(), self.born_low, self.born_high, self.died_low, self.died_high, self.floruit, self.fuzzy ))
+        self.born, self.died = life_dates.born, life_dates.died
+        self.born_low, self.born_high = life_dates.born_low, life_dates.born_high
+        self.died_low, self.died_high = life_dates.died_low, life_dates.died_high
+        self.floruit_low, self.floruit_high = life_dates.floruit_low, life_dates.floruit_high
+        self.fuzzy = life_dates.fuzzy
 
-    def __extract_links(self, soup):
-        body = soup.find('body')
-        if body != None:
+    def __extract_links(self, article):
+        if article.links != None:
             self.article_links = [ 
                 { 
-                    "article_id"  : self.__article_id_from_link(link["href"]), 
-                    "anchor_text" : self.__compress_space(link.getText()) 
+                    "article_id"  : self.__article_id_from_link(href), 
+                    "anchor_text" : self.__compress_space(text) 
                 } 
-                for link in body.find_all('a') if link.has_attr("href") 
+                for href, text in article.links 
             ]
 
     def __article_id_from_link(self, link):
@@ -315,20 +271,19 @@ class Entity:
         qs = urllib.parse.parse_qs(url.query)       
         return qs['articleId'][0] if 'articleId' in qs else None
 
-    def __extract_text_extracts(self, soup):
-        body = soup.find("body")        
-        pars = [par for par in [self.__compress_space(p.get_text()) for p in body.find_all("p")] if len(par) != 0]
+    def __extract_text_extracts(self, article):
+        pars = [par for par in [self.__compress_space(p) for p in article.paragraphs] if len(par) != 0]
         self.first_paragraph = pars[0]
         self.content = "\n\n".join(pars)
 
     def __debug(self, msg):
-        logging.debug("{:>4}: {}".format(self.fname, msg))
+        logging.debug("{:>4}: {}".format(self.name, msg))
 
     def __info(self, msg):
-        logging.info("{:>4}: {}".format(self.fname, msg))
+        logging.info("{:>4}: {}".format(self.name, msg))
 
     def __warn(self, msg):
-        logging.warn("{:>4}: {}".format(self.fname, msg))
+        logging.warn("{:>4}: {}".format(self.name, msg))
 
     def __error(self, msg):
-        logging.error("{:>4}: {}".format(self.fname, msg))
+        logging.error("{:>4}: {}".format(self.name, msg))
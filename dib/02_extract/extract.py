@@ -1,17 +1,21 @@
 #!/usr/bin/env python3
-import re
-import sys
+import os
 import json
-import nltk
+import hashlib
+import time
 import logging
-import urllib.parse
+import functools
 import multiprocessing
 from optparse import OptionParser
-from bs4 import BeautifulSoup
-from os.path import basename, splitext
 
-from entity_processor import Entity
-from config import HONORIFICS, TITLES, NORMALS
+from entity_processor import Entity, file_article_id
+from parsers import PARSERS, DEFAULT_PARSER
+from pagestore import PageStore
+import sources
+import scheduling
+import service
+from profiling import StageProfile, profile_articles
+from config import MAX_LABELS
 
 class EntityEncoder(json.JSONEncoder):
     def default(self, e):
@@ -43,6 +47,127 @@ class EntityEncoder(json.JSONEncoder):
 			# "locations"       : e.locations
         }
 
+# Page store opened by each worker process the first time it needs a page
+store = None
+
+def stored_entity(path, key, **options):
+	# Pages sent to the service come with their own HTML
+	if isinstance(key, sources.Page):
+		return Entity(key.html, key.article_id, **options)
+
+	global store
+	if store == None:
+		store = PageStore(path)
+	return Entity(store.get(key), key, **options)
+
+# Articles read out of an archive arrive with their contents, as do pages sent
+# to the service. Anything else is a path, and is read here in the worker
+def source_entity(task, **options):
+	if isinstance(task, sources.Page):
+		return Entity(task.html, task.article_id, **options)
+	if isinstance(task, sources.Spooled):
+		task = sources.unspool(task)
+	if isinstance(task, sources.Member):
+		return Entity(task.data, file_article_id(task.name), name=task.name, **options)
+	return Entity.from_file(task, **options)
+
+# Runs in the worker processes. Only the JSON line written out for the entity
+# is sent back to the parent, rather than the Entity with all of its text
+def entity_record(extract, arg):
+	return json.dumps(extract(arg), cls=EntityEncoder)
+
+# Runs in the worker processes when profiling. The time spent in each stage of
+# the entity goes back to the parent along with the JSON line
+def profiled_record(extract, arg):
+	entity = extract(arg, profile=True)
+	start = time.perf_counter()
+	record = json.dumps(entity, cls=EntityEncoder)
+	entity.timings["encode"] = time.perf_counter() - start
+	return sources.name(arg), record, entity.timings
+
+# Runs in the worker processes. Tags each result with the position of its
+# input so the parent can put results back in order
+def indexed(extract, task):
+	i, arg = task
+	return i, extract(arg)
+
+# Yields results in input order as they arrive in any order. Only results that
+# arrive ahead of one still being worked on are held back
+def reorder(results):
+	waiting = {}
+	next_index = 0
+	for i, result in results:
+		waiting[i] = result
+		while next_index in waiting:
+			yield waiting.pop(next_index)
+			next_index += 1
+
+# Estimated cost of extracting an input, for scheduling: its size. Pages in a
+# page store are compressed, which doesn't change which are the long ones
+def task_cost(store, arg):
+	if store != None:
+		return store.index[arg][2]
+	if isinstance(arg, sources.Member):
+		return len(arg.data)
+	if isinstance(arg, sources.Spooled):
+		return arg.size
+	return os.stat(arg).st_size
+
+# Incremental runs keep a manifest of every input extracted so far, one JSON
+# list per line:
+#
+#   [input, fingerprint, content hash, entity JSON line]
+#
+# The fingerprint is cheap to get (file size and modification time, where the
+# page sits in a page store, or the stamp of an archive member). Inputs whose
+# fingerprint is unchanged are taken as unchanged without being read. The rest
+# are hashed, and only those whose content has actually changed are extracted
+# again
+#
+# The first line holds the settings the entities were extracted with. If they
+# differ from this run's, none of the entities can be carried over
+def load_manifest(fname):
+	settings = None
+	manifest = {}
+	if os.path.exists(fname):
+		with open(fname, "r") as f:
+			for line in f:
+				entry = json.loads(line)
+				if isinstance(entry, dict):
+					settings = entry.get("settings")
+				else:
+					manifest[entry[0]] = entry
+	return settings, manifest
+
+# Modules whose code decides what is extracted from an article
+EXTRACTION_MODULES = ["extract.py", "entity_processor.py", "parsers.py", "names.py", "dates.py", "config.py", "fix.py"]
+
+# Hash of everything besides the article that goes into its entity: the
+# options that change what is extracted and the code and word lists that do
+# the extracting
+def extraction_settings(options):
+	here = os.path.dirname(os.path.abspath(__file__))
+	digest = hashlib.sha1(json.dumps([options.parser, options.max_labels, options.fix]).encode("utf-8"))
+	for module in EXTRACTION_MODULES:
+		with open(os.path.join(here, module), "rb") as f:
+			digest.update(f.read())
+	return digest.hexdigest()
+
+def fingerprint(store, arg):
+	if store != None:
+		return "{}:{}:{}".format(*store.index[arg][:3])
+	if isinstance(arg, sources.Member):
+		return arg.stamp
+	stat = os.stat(arg)
+	return "{}:{}".format(stat.st_size, stat.st_mtime_ns)
+
+def content_hash(store, arg):
+	if store != None:
+		content = store.get(arg).encode("utf-8")
+	else:
+		content = sources.read(arg)
+	return hashlib.sha1(content).hexdigest()
+
 # Main application class. Handles command line arguments and spins out worker
 # processes as requested to manage each of the input articles
 class EntityApp:
@@ -62,6 +187,91 @@ class EntityApp:
                   	action="store", type="int", dest="processes", default=4,
 	                help="number of parallel processes to use for extraction")
 
+		# Number of articles handed to a worker process at a time
+		parser.add_option("-c", "--chunksize",
+		                  action="store", type="int", dest="chunksize", default=16,
+		                  help="number of articles sent to a worker process at a time")
+
+		# Hand articles to the workers in input order, or longest first in
+		# batches sized to the work left, so no worker is left with a long
+		# article at the end of the run
+		parser.add_option("--schedule",
+		                  action="store", type="choice", dest="schedule", default="input",
+		                  choices=["input", "longest"],
+		                  help="order in which articles go to the workers: input (default) or longest first, writing entities as they finish, with a worker utilization report")
+
+		# Entities are written in input order by default. Writing them in the
+		# order they finish avoids holding any back behind a slow article
+		parser.add_option("-u", "--unordered",
+		                  action="store_true", dest="unordered", default=False,
+		                  help="write entities as they finish rather than in input order")
+
+		# Only extract articles that are new or have changed since the last
+		# run with the same manifest. Entities for the rest are carried over
+		parser.add_option("-i", "--incremental",
+		                  action="store", type="string", dest="manifest", default=None,
+		                  help="manifest of a previous run. Only new or changed articles are extracted")
+
+		# Apply the normalisation of fix.py to each article as it is read,
+		# instead of writing out a fixed copy of every article with it first
+		parser.add_option("-f", "--fix",
+		                  action="store_true", dest="fix", default=False,
+		                  help="normalise dashes, quotes and spaces as fix.py does while reading each article")
+
+		# Only the archive members whose file names match this pattern are
+		# extracted, leaving out anything else that was archived with them
+		parser.add_option("--members",
+		                  action="store", type="string", dest="members", default="*",
+		                  help="pattern matching the names of the archive members to extract, e.g. \"*.html\" (all by default)")
+
+		# Read the articles from a page store rather than from files. Any
+		# arguments name the articles to extract. All articles are used if
+		# there are none
+		parser.add_option("-s", "--store",
+		                  action="store", type="string", dest="store", default=None,
+		                  help="page store from which the articles should be read")
+
+		# HTML parser used to read the articles. "lxml" only picks out the
+		# parts of the page that are used. "soup" builds the whole document
+		# with BeautifulSoup and is kept as the reference to check it against
+		parser.add_option("--parser",
+		                  action="store", type="choice", dest="parser", default=DEFAULT_PARSER,
+		                  choices=sorted(PARSERS),
+		                  help="HTML parser to use: {} (default {})".format(" or ".join(sorted(PARSERS)), DEFAULT_PARSER))
+
+		# Cap on the labels generated for each entity. The default comes from
+		# MAX_LABELS in config.py
+		parser.add_option("--max-labels",
+		                  action="store", type="int", dest="max_labels", default=MAX_LABELS,
+		                  help="most labels to generate for any one entity (no limit by default)")
+
+		# Time every stage of the extraction of each article and report where
+		# the time went once the run is over
+		parser.add_option("--profile",
+		                  action="store_true", dest="profile", default=False,
+		                  help="time each stage of the extraction and report the totals, percentiles and slowest articles")
+
+		# Extract the slowest articles again under cProfile, once profiling
+		# has found them
+		parser.add_option("--cprofile",
+		                  action="store", type="int", dest="cprofile", default=0,
+		                  help="with --profile, run the N slowest articles again under cProfile")
+
+		parser.add_option("--cprofile-output",
+		                  action="store", type="string", dest="cprofile_output", default="slowest.prof",
+		                  help="file to which the cProfile stats are written (default slowest.prof)")
+
+		# Keep running as a service with a warm pool of worker processes,
+		# extracting the articles sent to it a request at a time. See
+		# service.py for the requests and replies
+		parser.add_option("--serve",
+		                  action="store_true", dest="serve", default=False,
+		                  help="run as a service, reading JSON requests from stdin, one per line, and writing a JSON reply to each")
+
+		parser.add_option("--socket",
+		                  action="store", type="string", dest="socket", default=None,
+		                  help="with --serve, take requests from clients of this Unix socket instead of stdin")
+
 		# Used to determine the logging level of the output
 		# WARNING when false. INFO when true
 		parser.add_option("-v", "--verbose",
@@ -71,39 +281,208 @@ class EntityApp:
 		# Parse user inputs using OptionParser
 		(self.options, self.args) = parser.parse_args()
 
+		if self.options.cprofile > 0:
+			self.options.profile = True
+
+		if self.options.socket != None:
+			self.options.serve = True
+
+		self.profile = StageProfile(max(10, self.options.cprofile)) if self.options.profile else None
+		self.utilization = None
+
 		# Enable logging so we can monitor progress
 		logging.basicConfig(
 			format='%(asctime)s : %(levelname)s : %(message)s',
 			level = logging.INFO if self.options.verbose else logging.WARNING
 		)	
 
+		if self.options.schedule == "longest" and self.options.processes < 2:
+			logging.warning("--schedule longest needs at least 2 processes (-p). Articles are extracted in input order")
+
+		if self.options.store != None and len(self.args) < 1 and not self.options.serve:
+			self.args = PageStore(self.options.store).keys()
+
 		# If no input was given, print usage information and quit the program
-		if len(self.args) < 1:
+		if len(self.args) < 1 and not self.options.serve:
 			parser.print_help()
 			exit()
 
-		self.extracted = []
 
-		# We could be using the length of the args list quite a bit. So lets
-		# just store it
-		self.num_inputs = len(self.args)
-
-	def _write_results(self):
+	# Each entity is written as soon as it is available, so memory use does not
+	# grow with the size of the corpus and a run that dies part way through
+	# leaves everything extracted so far on disk
+	def _write_results(self, records):
 		with open(self.options.output, "w") as f:
-			for e in self.extracted:
-				f.write("{}\n".format(json.dumps(e, cls=EntityEncoder)))
+			for record in records:
+				f.write("{}\n".format(record))
+
+	# Function that extracts the Entity for one input
+	def _extractor(self):
+		options = {
+			"parser"     : self.options.parser,
+			"max_labels" : self.options.max_labels,
+			"normalize"  : self.options.fix
+		}
+
+		if self.options.store != None:
+			return functools.partial(stored_entity, self.options.store, **options)
+		return functools.partial(source_entity, **options)
+
+	# The inputs, found as they are needed. Arguments can be files,
+	# directories, glob patterns or archives, or the keys of a page store
+	def _inputs(self, args):
+		if self.options.store != None:
+			return iter(args)
+		return sources.expand(args, self.options.members)
+
+	def _extract(self, args, ordered=True):
+		record = profiled_record if self.profile != None else entity_record
+		extract = functools.partial(record, self._extractor())
 
-	def run(self):
 		if self.options.processes < 2:
-			self.extracted = [Entity(arg) for arg in self.args]
+			records = (extract(arg) for arg in args)
 		else:
-			# The Pool resource in multiprocessing makes parallelising this 
-			# kind of problem ridiculously easy
-			p = multiprocessing.Pool(self.options.processes)
-			self.extracted = p.map(Entity, self.args)
+			results = self._pooled(extract, args)
+			if ordered:
+				records = reorder(results)
+			else:
+				records = (e for _, e in results)
+
+		if self.profile != None:
+			records = self._profiled(records)
+		return records
+
+	# Yields (input number, record) pairs as the workers finish them. The pool
+	# is only started once the first record is asked for, and is shut down
+	# when the last has been taken
+	def _pooled(self, extract, args):
+		# The Pool resource in multiprocessing makes parallelising this 
+		# kind of problem ridiculously easy
+		with multiprocessing.Pool(self.options.processes) as p:
+			if self.options.schedule == "longest":
+				yield from self._scheduled(p, extract, args)
+			else:
+				yield from p.imap_unordered(functools.partial(indexed, extract), enumerate(args), self.options.chunksize)
+
+	# Hands out the inputs longest first. They all have to be found and sized
+	# before the first can go out. Archive members wait for their turn in a
+	# spool file, so their contents aren't all held in memory meanwhile
+	def _scheduled(self, pool, extract, args):
+		store = PageStore(self.options.store) if self.options.store != None else None
+		spool = sources.Spool()
+		try:
+			tasks = []
+			costs = []
+			for arg in args:
+				if isinstance(arg, sources.Member):
+					arg = spool.add(arg)
+				tasks.append(arg)
+				costs.append(task_cost(store, arg))
+			spool.flush()
+
+			self.utilization = scheduling.Utilization(self.options.processes)
+			batches = scheduling.batches(costs, self.options.processes)
+			logging.info("{} articles in {} batches".format(len(tasks), len(batches)))
+
+			batches = ( [ (i, tasks[i]) for i in batch ] for batch in batches )
+			for pid, start, end, results in pool.imap_unordered(functools.partial(scheduling.run_batch, extract), batches):
+				self.utilization.add(pid, start, end, len(results))
+				yield from results
+		finally:
+			spool.close()
+
+	# Takes the stage timings off each record as it goes by
+	def _profiled(self, records):
+		for arg, record, timings in records:
+			self.profile.add(arg, timings)
+			yield record
+
+	def _report_profile(self):
+		self.profile.report()
+
+		if self.options.cprofile > 0:
+			# The inputs are found again, as the contents of archive members
+			# are not held on to
+			slowest = set( arg for _, arg in self.profile.slowest_articles(self.options.cprofile) )
+			tasks = [ task for task in self._inputs(self.args) if sources.name(task) in slowest ]
+			profile_articles(self._extractor(), tasks, self.options.cprofile_output)
+
+	def _run_incremental(self):
+		settings = extraction_settings(self.options)
+		saved, manifest = load_manifest(self.options.manifest)
+		store = PageStore(self.options.store) if self.options.store != None else None
+
+		stale = len(manifest) > 0 and saved != settings
+		if stale:
+			logging.info("Extraction settings or code have changed since the manifest was written, so every article is extracted again")
+
+		entries = []
+		changed = []
+		for arg in self._inputs(self.args):
+			name = sources.name(arg)
+			entry = manifest.get(name) if not stale else None
+			stamp = fingerprint(store, arg)
+
+			if entry != None and entry[1] == stamp:
+				entries.append(entry)
+				continue
+
+			digest = content_hash(store, arg)
+			if entry != None and entry[2] == digest:
+				entries.append([name, stamp, digest, entry[3]])
+			else:
+				entries.append([name, stamp, digest, None])
+				changed.append(arg)
+
+		removed = len(set(manifest) - set( entry[0] for entry in entries ))
+		logging.info("{} unchanged, {} to extract, {} removed".format(len(entries) - len(changed), len(changed), removed))
+
+		# Entities are merged in input order, new ones taking the place of any
+		# older entity for the same input. Inputs that have gone drop out
+		extracted = self._extract(changed) if len(changed) > 0 else iter(())
+		def merged():
+			for entry in entries:
+				if entry[3] == None:
+					entry[3] = next(extracted)
+				yield entry[3]
+
+		self._write_results(merged())
+
+		with open(self.options.manifest + ".tmp", "w") as f:
+			f.write("{}\n".format(json.dumps({ "settings": settings })))
+			for entry in entries:
+				f.write("{}\n".format(json.dumps(entry)))
+		os.replace(self.options.manifest + ".tmp", self.options.manifest)
+
+	# Extracts the articles of each request as it comes in, with the one pool
+	# of worker processes kept for as long as the service runs
+	def _serve(self):
+		s = service.Service(functools.partial(entity_record, self._extractor()), self._inputs, self.options.processes)
+		try:
+			s.serve(self.options.socket)
+		finally:
+			s.close()
+			s.report()
+
+	def run(self):
+		if self.options.serve:
+			self._serve()
+		elif self.options.manifest != None:
+			self._run_incremental()
+		else:
+			# Longest first output would have to be held back almost until
+			# the end to be put in input order, so it is written as it comes
+			ordered = not self.options.unordered and self.options.schedule != "longest"
+			extracted = self._extract(self._inputs(self.args), ordered=ordered)
+
+			# output our extracted entities to the destination file
+			self._write_results(extracted)
+
+		if self.utilization != None:
+			self.utilization.report()
 
-		# output our extracted entities to the destination file
-		self._write_results()
+		if self.profile != None:
+			self._report_profile()
 
 # Boiler plate python if __name__ == "__main__" code.
 # Actual program runs from the EntityApp class
@@ -3,14 +3,19 @@ import sys
 import re
 from os.path import basename, splitext
 
+# En dashes become hyphens and curly single quotes straight ones, in one pass
+# over the text, and runs of spaces are collapsed. extract.py --fix applies
+# this to each article as it is read, which saves writing out a fixed copy of
+# the whole corpus with this script first
+dashes_and_quotes = str.maketrans({ "–" : "-", "‘" : "'", "’" : "'" })
+spaces = re.compile(" +")
+
+def normalize(content):
+    return spaces.sub(" ", content.translate(dashes_and_quotes).strip())
+
 def process( fname ):
     with open(fname, "r") as f:
-        content = f.read()
-        content = content.replace("–", "-")      
-        content = content.replace("‘", "'")
-        content = content.replace("’", "'")
-        content = re.sub(" +", " ", content.strip())
-        return content
+        return normalize(f.read())
 
 def main(args):
     for arg in args:
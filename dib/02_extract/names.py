@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+import re
+import functools
+from config import HONORIFICS, TITLES, LOCATIONS, NORMALS
+
+# The name patterns in config.py compiled once, at import, into something
+# quicker to apply than running each pattern with re in turn. Every function
+# here gives exactly the same result as applying the config.py patterns one
+# after another
+
+INLINE_IGNORECASE = "(?i)"
+
+# Anchored patterns made only of literal characters, escaped characters and
+# optional (?) characters, like r"^mr\.?$", are expanded into the set of
+# lowercase strings they match. Returns None for anything more complicated
+def literal_forms(pattern):
+    if not (pattern.startswith("^") and pattern.endswith("$") and not pattern.endswith("\\$")):
+        return None
+
+    forms = [""]
+    body = pattern[1:-1]
+    i = 0
+    while i < len(body):
+        if body[i] == "\\":
+            if i + 1 >= len(body) or body[i+1].isalnum():
+                return None
+            char = body[i+1]
+            i += 2
+        elif body[i] in ".^$*+?{}[]()|":
+            return None
+        else:
+            char = body[i]
+            i += 1
+
+        if not char.isascii():
+            return None
+        char = char.lower()
+
+        if i < len(body) and body[i] == "?":
+            forms = forms + [ form + char for form in forms ]
+            i += 1
+        else:
+            forms = [ form + char for form in forms ]
+
+        if i < len(body) and body[i] in "*+{":
+            return None
+
+    return set(forms)
+
+def strip_inline_flags(pattern):
+    return pattern[len(INLINE_IGNORECASE):] if pattern.startswith(INLINE_IGNORECASE) else pattern
+
+# Stands in for calling re.match(pattern, term, re.IGNORECASE) for each
+# pattern of a pattern set. Literal patterns become a set lookup and the rest
+# are combined into a single regular expression
+class PatternSet:
+    def __init__(self, patterns):
+        self.tokens = set()
+        rest = []
+
+        for pattern in patterns:
+            forms = literal_forms(pattern)
+            if forms == None:
+                rest.append(pattern)
+            else:
+                self.tokens |= forms
+
+        self.rest = self.__combine(rest)
+        self.all  = self.__combine(patterns)
+
+    def __combine(self, patterns):
+        if len(patterns) == 0:
+            return None
+        return re.compile("|".join("(?:{})".format(strip_inline_flags(p)) for p in patterns), re.IGNORECASE)
+
+    def match(self, term):
+        # Case-insensitive matching outside ASCII follows Unicode case folding
+        # rules a plain lower() does not, so those terms go to the regex
+        if not term.isascii():
+            return self.all != None and self.all.match(term) != None
+
+        lowered = term.lower()
+        # $ also matches in front of a trailing newline
+        if lowered in self.tokens or (lowered.endswith("\n") and lowered[:-1] in self.tokens):
+            return True
+
+        return self.rest != None and self.rest.match(term) != None
+
+honorifics = PatternSet(HONORIFICS)
+titles     = PatternSet(TITLES)
+locations  = PatternSet(LOCATIONS)
+
+# Filtering out honorifics and then titles removes the same tokens as
+# filtering out either in one go
+titles_honorifics = PatternSet(HONORIFICS + TITLES)
+
+location_patterns = [ re.compile(pattern) for pattern in LOCATIONS ]
+whitespace = re.compile(r"\s+")
+
+# Each normalisation can create text a later one rewrites, so they still have
+# to be applied in order. Most names need none of them though, which a single
+# search over all of the patterns at once establishes cheaply
+normal_patterns = [ (re.compile(pattern), sub) for pattern, sub in NORMALS ]
+any_normal = re.compile("|".join(
+    "(?i:{})".format(strip_inline_flags(pattern)) if pattern.startswith(INLINE_IGNORECASE) else "(?:{})".format(pattern)
+    for pattern, _ in NORMALS
+))
+
+def normalize(name):
+    if any_normal.search(name) == None:
+        return name
+
+    for pattern, sub in normal_patterns:
+        name = pattern.sub(sub, name)
+
+    return name
+
+# The same names and parts of names ("Sir", "of Kinsale", common forenames)
+# turn up across thousands of articles, so each worker process remembers what
+# these came out as
+CACHE_SIZE = 1 << 16
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def collapse_locations(name):
+    for pattern in location_patterns:
+        name = whitespace.sub(" ", pattern.sub("", name)).strip()
+
+    return name
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def collapse_titles_honorifics(name):
+    return " ".join( part for part in name.split(" ") if not titles_honorifics.match(part) )
+
+# Labels of an entity in the order they were generated, without duplicates.
+# Membership is checked against a set rather than by searching the list. Once
+# `limit` labels are held no more are added. Labels added while iterating
+# over the set are still reached by the same iteration, which is what lets
+# each transformation also apply to the labels it produced
+class LabelSet:
+    def __init__(self, limit=None):
+        self.labels = []
+        self.seen   = set()
+        self.limit  = limit
+
+    def full(self):
+        return self.limit != None and len(self.labels) >= self.limit
+
+    def add(self, label):
+        if len(label) > 0 and label not in self.seen and not self.full():
+            self.labels.append(label)
+            self.seen.add(label)
+
+    # Adds every label as given, even if it is already held
+    def extend(self, labels):
+        for label in labels:
+            if self.full():
+                break
+            self.labels.append(label)
+            self.seen.add(label)
+
+    def __iter__(self):
+        return iter(self.labels)
+
+    def __len__(self):
+        return len(self.labels)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import random
+from optparse import OptionParser
+
+import bench
+from entity_processor import Entity, file_article_id
+from extract import EntityEncoder
+from pagestore import PageStore
+from parsers import PARSERS
+
+# Checks that every HTML parser in parsers.py gives exactly the same entities
+# for a sample of articles, and how long each takes to do it. The "soup"
+# parser is the reference the others are compared against. Given no articles,
+# it compares the synthetic articles of bench.py and the pages below
+REFERENCE = "soup"
+
+# Markup the parsers are most likely to read differently, each in an article
+# of its own. Only the anchor text of links and the life dates in the first
+# paragraph show in an entity, so the hidden text holds other dates. Links
+# are written the way both ODNB and DIB articles link to each other
+LINK = "quickSearch.do?articleId=a{0}&amp;ref:odnb/{0}"
+
+EDGE_CASES = {
+    "template"   : '<template><p>Jones, Ann (1500-1550)</p></template><p>Smith, John <template>(1500-1550)</template>(1600-1650), was <template><a href="{0}">hidden</a></template>born in <a href="{1}">York <template>unseen</template>Minster</a>.</p>'.format(LINK.format(10002), LINK.format(10003)),
+    "ruby"       : '<p>Smith, John <ruby>漢<rp>(</rp><rt>1500-1550</rt><rp>)</rp></ruby> (1600-1650), <a href="{0}">son <ruby>of<rt>1500</rt></ruby> Hugh</a>.</p>'.format(LINK.format(10004)),
+    "script"     : '<p><script>document.write("<p>(1500-1550)</p>");</script>Smith, John (1600-1650), bishop</p><script><a href="{0}">not a link</a></script>'.format(LINK.format(10005)),
+    "style"      : '<style>p:before {{ content: "(1500-1550)" }}</style><p>Smith, John <style>b {{ }}</style>(1600-1650), <a href="{0}">by <style>i {{ }}</style>name</a></p>'.format(LINK.format(10006)),
+    "nested"     : '<p>Smith, John <div><p>(1500-1550)</p></div> (1600-1650)</p><p>One<p>Two <a href="{0}">link <p>split</a><p>Three'.format(LINK.format(10007)),
+    "comments"   : '<p>Smith, John <!-- (1500-1550) -->(1600-1650)<?pi (1400-1450)?>, bishop</p><p><a href="{0}">A <!-- b --> c</a></p>'.format(LINK.format(10008)),
+    "anchors"    : '<p>Smith, John (1600-1650)</p><a>no href</a><a href="">empty</a><a href="{0}"><a href="{1}">nested</a></a><p><a name="x" href="{2}#x">named</a></p>'.format(LINK.format(10009), LINK.format(10010), LINK.format(10011)),
+    "entities"   : '<p>Smith &amp; Son, John&nbsp;(c.1600&ndash;1650) ‘quoted’ &lt;p&gt; &#169; &unknown;</p><a href="{0}">&lt;b&gt;&amp;</a>'.format(LINK.format(10012)),
+    "whitespace" : '<p>\n  </p><p>Smith,\tJohn\n\n (1600-\n1650)  </p><p></p><a href="{0}">\n spread \t out </a>'.format(LINK.format(10013)),
+}
+
+EDGE_CASE_PAGE = '<?xml version="1.0" encoding="UTF-8"?>\n<html><head><title>Smith, John (1600-1650)</title></head><body><h1>Smith, John</h1>{}</body></html>'
+
+# (article ID, HTML) for the synthetic articles and edge cases. Sized and
+# seeded by the same options as a sample of real articles
+def synthetic_articles(options):
+    settings = bench.option_parser().get_default_values()
+    settings.seed = options.seed
+    if options.sample != None:
+        settings.articles = options.sample
+
+    edge_cases = [ ("edge-" + name, EDGE_CASE_PAGE.format(body)) for name, body in sorted(EDGE_CASES.items()) ]
+    return bench.generate_articles(settings) + edge_cases
+
+# The entity as it would be written by extract.py, or the exception raised
+# trying to extract it
+def extract(parser, article_id, html):
+    try:
+        entity = Entity(html, article_id, parser=parser)
+        return json.loads(json.dumps(entity, cls=EntityEncoder))
+    except Exception as e:
+        return { "error" : type(e).__name__ }
+
+def differences(reference, other):
+    fields = sorted(set(reference) | set(other))
+    return [ field for field in fields if reference.get(field) != other.get(field) ]
+
+def process_args():
+    parser = OptionParser(usage="usage: %prog [options] [FILE ...]")
+
+    parser.add_option("-s", "--store",
+        action="store", type="string", dest="store", default=None,
+        help="read the articles from this page store rather than from files"
+    )
+
+    parser.add_option("-n", "--sample",
+        action="store", type="int", dest="sample", default=None,
+        help="only compare a random sample of this many articles (or this many synthetic ones)"
+    )
+
+    parser.add_option("--seed",
+        action="store", type="int", dest="seed", default=0,
+        help="seed for choosing the random sample (or generating the synthetic articles)"
+    )
+
+    options, args = parser.parse_args()
+
+    if options.store != None and len(args) == 0:
+        args = PageStore(options.store).keys()
+
+    if len(args) == 1 and os.path.isdir(args[0]):
+        args = [ os.path.join(args[0], o) for o in sorted(os.listdir(args[0])) ]
+
+    # The synthetic articles are compared when there are no real ones
+    if options.store == None and len(args) == 0:
+        return options, synthetic_articles(options)
+
+    if options.sample != None and options.sample < len(args):
+        args = random.Random(options.seed).sample(args, options.sample)
+
+    return options, args
+
+def main():
+    options, args = process_args()
+    store = PageStore(options.store) if options.store != None else None
+
+    others = sorted( parser for parser in PARSERS if parser != REFERENCE )
+    timings = { parser : 0.0 for parser in PARSERS }
+    mismatched = 0
+
+    for arg in args:
+        if isinstance(arg, tuple):
+            article_id, html = arg
+            arg = article_id
+        elif store != None:
+            article_id, html = arg, store.get(arg)
+        else:
+            with open(arg, "r") as f:
+                article_id, html = file_article_id(arg), f.read()
+
+        results = {}
+        for parser in PARSERS:
+            start = time.perf_counter()
+            results[parser] = extract(parser, article_id, html)
+            timings[parser] += time.perf_counter() - start
+
+        for parser in others:
+            fields = differences(results[REFERENCE], results[parser])
+            if len(fields) > 0:
+                mismatched += 1
+                print("{}: {} differs from {} in {}".format(arg, parser, REFERENCE, ", ".join(fields)))
+                for field in fields:
+                    print("  {:<8} {}".format(REFERENCE, json.dumps(results[REFERENCE].get(field))))
+                    print("  {:<8} {}".format(parser, json.dumps(results[parser].get(field))))
+
+    for parser in sorted(PARSERS):
+        print("{:<8} {:.2f}s ({:.1f} articles/sec)".format(
+            parser, timings[parser], len(args) / timings[parser] if timings[parser] > 0 else 0), file=sys.stderr)
+
+    print("{} articles compared, {} mismatched".format(len(args), mismatched), file=sys.stderr)
+    sys.exit(1 if mismatched > 0 else 0)
+
+if __name__ == "__main__":
+    main()
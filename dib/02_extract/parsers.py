@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+from collections import namedtuple
+
+from lxml import etree
+
+# The parts of an article page that Entity uses. `links` is a list of
+# (href, text) pairs for the anchors in the body that have an href and
+# `paragraphs` the text of each p element in the body. `title` is None when
+# the page has no title, and `links` and `paragraphs` are None when it has no
+# body
+Article = namedtuple("Article", ["title", "links", "paragraphs"])
+
+# Reference parser. Builds the whole document with BeautifulSoup and searches
+# it, as Entity always used to. BeautifulSoup is slow to import, so it is only
+# imported once this parser is actually used
+def soup_parser(html):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "lxml")
+
+    title = soup.find("title")
+    title = title.getText() if title != None else None
+
+    body = soup.find("body")
+    if body == None:
+        return Article(title, None, None)
+
+    links = [ (link["href"], link.getText()) for link in body.find_all("a") if link.has_attr("href") ]
+    paragraphs = [ p.get_text() for p in body.find_all("p") ]
+
+    return Article(title, links, paragraphs)
+
+# get_text() in BeautifulSoup leaves out comments, processing instructions and
+# the contents of these elements, so the lxml parser has to as well
+SKIPPED_TEXT = { "script", "style", "template", "rt", "rp" }
+
+def element_text(element):
+    parts = []
+    collect_text(element, parts)
+    return "".join(parts)
+
+def collect_text(element, parts):
+    if element.text != None:
+        parts.append(element.text)
+    for child in element:
+        # Comments and processing instructions have a function for a tag.
+        # Their text is skipped but the text that follows them is not
+        if isinstance(child.tag, str) and child.tag not in SKIPPED_TEXT:
+            collect_text(child, parts)
+        if child.tail != None:
+            parts.append(child.tail)
+
+# Fast parser. The page is parsed with the same libxml2 HTML parser
+# BeautifulSoup uses, but straight into lxml's own tree, and only the title,
+# anchors and paragraphs are ever looked at. The anchors and paragraphs are
+# found together in a single walk over the body. The page goes to lxml as
+# UTF-8 bytes because lxml refuses text that starts with an XML declaration
+html_parser = etree.HTMLParser(encoding="utf-8")
+
+def lxml_parser(html):
+    tree = etree.fromstring(html.encode("utf-8"), html_parser) if len(html) > 0 else None
+    if tree == None:
+        return Article(None, None, None)
+
+    title = next(tree.iter("title"), None)
+    title = element_text(title) if title != None else None
+
+    body = next(tree.iter("body"), None)
+    if body == None:
+        return Article(title, None, None)
+
+    # BeautifulSoup still finds the anchors and paragraphs inside the elements
+    # in SKIPPED_TEXT, but gets no text for them. Those elements come before
+    # anything inside them in the walk
+    hidden = set()
+    links = []
+    paragraphs = []
+    for element in body.iter("a", "p", *SKIPPED_TEXT):
+        if element.tag in SKIPPED_TEXT:
+            hidden.update(element.iter("a", "p"))
+            continue
+
+        text = element_text(element) if element not in hidden else ""
+        if element.tag == "p":
+            paragraphs.append(text)
+        elif element.get("href") != None:
+            links.append((element.get("href"), text))
+
+    return Article(title, links, paragraphs)
+
+PARSERS = {
+    "soup" : soup_parser,
+    "lxml" : lxml_parser
+}
+
+DEFAULT_PARSER = "lxml"
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+
+# Scheduling for the pool of worker processes. A handful of articles (the
+# monarchs and prime ministers) are many times longer than the rest. Handed
+# out in input order, one of them can turn up near the end of the run and
+# leave one worker busy long after the others have run out of work.
+#
+# Articles are instead handed out longest first, going by their size, in
+# batches that shrink as the work remaining does. The long articles go out
+# first and on their own, and the many small ones go out many to a batch.
+# Each batch is sized at a share of the work still to do (guided
+# self-scheduling), so the last batches are small and every worker runs out
+# of work at about the same time
+
+# Each batch is at most this share of the remaining work of one worker
+BATCHES_PER_WORKER = 4
+
+# `costs` are the estimated costs of the tasks, in input order. Only their
+# (index, cost) pairs are sorted, never the tasks themselves. Returns the
+# indices of the tasks in batches, most costly first
+def batches(costs, workers):
+    order = sorted(enumerate(costs), key=lambda task: -task[1])
+    remaining = sum(costs)
+
+    scheduled = []
+    batch = []
+    cost = 0
+    for i, _ in order:
+        batch.append(i)
+        cost += costs[i]
+        if cost >= remaining / (workers * BATCHES_PER_WORKER):
+            scheduled.append(batch)
+            remaining -= cost
+            batch = []
+            cost = 0
+
+    if len(batch) > 0:
+        scheduled.append(batch)
+    return scheduled
+
+# Runs in the worker processes. Extracts a batch of tasks, noting which worker
+# did it and when, for the utilization report
+def run_batch(extract, batch):
+    start = time.time()
+    results = [ (i, extract(arg)) for i, arg in batch ]
+    return os.getpid(), start, time.time(), results
+
+# How busy each worker was over the run, from the batches they reported
+class Utilization:
+    def __init__(self, workers):
+        self.workers = workers
+        self.start   = time.time()
+        self.busy    = {}
+        self.tasks   = {}
+        self.last    = {}
+
+    def add(self, pid, start, end, tasks):
+        self.busy[pid]  = self.busy.get(pid, 0) + end - start
+        self.tasks[pid] = self.tasks.get(pid, 0) + tasks
+        self.last[pid]  = max(self.last.get(pid, 0), end)
+
+    def report(self, f=sys.stderr):
+        if len(self.busy) == 0:
+            return
+
+        end = max(self.last.values())
+        elapsed = end - self.start
+        busy = sum(self.busy.values())
+
+        print("{} workers for {:.2f}s, {:.1f}% utilization".format(
+            self.workers, elapsed, 100 * busy / (self.workers * elapsed) if elapsed > 0 else 0), file=f)
+
+        for pid in sorted(self.busy, key=lambda pid: self.last[pid]):
+            print("  worker {:<8} {:>7} articles, busy {:.2f}s ({:.1f}%), done at {:.2f}s".format(
+                pid, self.tasks[pid], self.busy[pid], 100 * self.busy[pid] / elapsed if elapsed > 0 else 0,
+                self.last[pid] - self.start), file=f)
+
+        # Workers that never got a batch ran out of work straight away
+        first_idle = self.start if len(self.busy) < self.workers else min(self.last.values())
+        print("tail: {:.2f}s from the first worker running out of work to the last finishing".format(end - first_idle), file=f)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import subprocess
+from optparse import OptionParser
+
+# Measures how long each entry point of the pipeline takes to import, which is
+# what every run, and every worker process started with spawn, pays before it
+# does any work. Each module is imported in a fresh interpreter, from its own
+# directory as when it is run. The time is the best of a few runs, less the
+# time to start an interpreter that imports nothing. Python's own -X importtime
+# report gives the modules that cost the most
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+ENTRY_POINTS = [
+    ("odnb/02_extract", "extract"),
+    ("dib/02_extract", "extract"),
+    ("link", "link_to_dbpedia"),
+    ("link", "create_link_map"),
+    ("to_ttl", "to_ttl"),
+]
+
+def run_import(directory, module, importtime=False):
+    command = [ sys.executable ]
+    if importtime:
+        command += [ "-X", "importtime" ]
+    command += [ "-c", "import {}".format(module) if module != None else "pass" ]
+
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=os.path.join(ROOT, directory), capture_output=True, text=True)
+    return time.perf_counter() - start, result
+
+def best_time(directory, module, repeat):
+    return min( run_import(directory, module)[0] for _ in range(repeat) )
+
+# -X importtime writes one line per module imported, after the modules it
+# imported itself, which are indented two spaces more:
+#
+#   import time: self [us] | cumulative | imported package
+#
+# The costliest of the modules the given module imports directly are returned
+def heaviest_imports(stderr, module, top):
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name.rstrip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            imports.append((int(cumulative), name.strip()))
+        elif depth == 0:
+            if name.strip() == module:
+                return sorted(imports, reverse=True)[:top]
+            imports = []
+    return []
+
+def process_args():
+    parser = OptionParser(usage="usage: %prog [options] [DIRECTORY/MODULE ...]")
+
+    parser.add_option("-r", "--repeat",
+        action="store", type="int", dest="repeat", default=5,
+        help="times to import each module. The fastest is reported"
+    )
+
+    parser.add_option("-t", "--top",
+        action="store", type="int", dest="top", default=5,
+        help="number of the most costly imports to list for each module"
+    )
+
+    options, args = parser.parse_args()
+
+    entry_points = ENTRY_POINTS
+    if len(args) > 0:
+        entry_points = [ os.path.split(arg) for arg in args ]
+
+    return options, entry_points
+
+def main():
+    options, entry_points = process_args()
+
+    interpreter = best_time(".", None, options.repeat)
+    print("interpreter startup {:.1f}ms".format(interpreter * 1000))
+
+    for directory, module in entry_points:
+        name = "{}/{}.py".format(directory, module)
+        _, result = run_import(directory, module, importtime=True)
+
+        if result.returncode != 0:
+            error = result.stderr.strip().splitlines()[-1] if len(result.stderr.strip()) > 0 else "exit status {}".format(result.returncode)
+            print("{:<32} failed: {}".format(name, error))
+            continue
+
+        elapsed = best_time(directory, module, options.repeat) - interpreter
+        heaviest = heaviest_imports(result.stderr, module, options.top)
+        print("{:<32} {:>8.1f}ms  {}".format(name, elapsed * 1000,
+            ", ".join( "{} {:.1f}ms".format(package, us / 1000) for us, package in heaviest )))
+
+if __name__ == "__main__":
+    main()
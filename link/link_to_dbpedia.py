@@ -4,25 +4,29 @@ import re
 import sys
 import csv
 import json
-import pysolr
-import gensim
+import functools
 import itertools
 import logging
 
-import networkx as nx
-
-from nltk.corpus import stopwords
 from optparse import OptionParser
-from gensim.similarities import WmdSimilarity
-from gensim.corpora.wikicorpus import tokenize
-from pyjarowinkler.distance import get_jaro_distance
 
-stopwords = stopwords.words('english')
+# gensim, pysolr, networkx and NLTK are all slow to import, and the stopwords
+# corpus has to be read from disk as well. Each is imported the first time the
+# function that needs it runs, so printing the usage or failing on a bad
+# argument is quick
+
+@functools.lru_cache(maxsize=None)
+def english_stopwords():
+	from nltk.corpus import stopwords
+	return set(stopwords.words('english'))
 
 def similarity( t1, t2 ):
+		from pyjarowinkler.distance import get_jaro_distance
 		return get_jaro_distance(t1, t2)
 
 def find_optimal_match(  nameparts1, nameparts2, sim_thresh = 0 ):
+	import networkx as nx
+
 	graph = nx.Graph()
 	graph.add_nodes_from(["1_{}".format(i) for i in nameparts1], bipartite=0)
 	graph.add_nodes_from(["2_{}".format(i) for i in nameparts2], bipartite=1)
@@ -60,14 +64,21 @@ def name_similarity( n1, n2 ):
 	return total_sim
 
 def load_model(path):
+	import gensim
+
 	model = gensim.models.Word2Vec.load(path)	
 	return model
 
 def connect_solr(path, timeout=10000):
+	import pysolr
+
 	solr = pysolr.Solr(path, timeout=timeout)
 	return solr
 
 def stopword_tokenize( text ):
+	from gensim.corpora.wikicorpus import tokenize
+
+	stopwords = english_stopwords()
 	return [ t for t in tokenize(text) if t not in stopwords ]
 
 def link( person, model, solr, rows=10, alpha=0.1, beta=0.9 ):
@@ -93,6 +104,7 @@ def link( person, model, solr, rows=10, alpha=0.1, beta=0.9 ):
 	# Tokenize the text from each of the solr results
 	text = [ stopword_tokenize(item["text"]) for item in top_n ]
 	# Build a WMD similarity index from the Solr text results
+	from gensim.similarities import WmdSimilarity
 	comparator = WmdSimilarity(text, model)
 	# Compute the similarity between essay and all solr results
 	content_similarities = comparator[tokens]
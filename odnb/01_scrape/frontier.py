@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+import time
+import sqlite3
+
+PENDING   = "pending"
+FETCHED   = "fetched"
+UNCHANGED = "unchanged"
+FAILED    = "failed"
+RETRY     = "retry"
+
+# Pages for which we hold a current copy
+DONE = (FETCHED, UNCHANGED)
+
+# Persistent record of every page in a crawl and how far we got with it. Each
+# page is keyed on the name it is saved under, so checking or updating a page
+# is a single primary key lookup however large the crawl gets. Updates are
+# committed as they happen, so a crawl that dies can be restarted from exactly
+# where it stopped
+class CrawlFrontier:
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                key         TEXT PRIMARY KEY,
+                url         TEXT NOT NULL,
+                status      TEXT NOT NULL,
+                attempts    INTEGER NOT NULL DEFAULT 0,
+                retry_after REAL NOT NULL DEFAULT 0,
+                error       TEXT
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS pages_status ON pages (status)")
+
+        # HTTP validators used to revalidate pages when recrawling. Added
+        # separately so crawl databases from before they existed still open
+        columns = [ row[1] for row in self.db.execute("PRAGMA table_info(pages)") ]
+        for column in ("etag", "last_modified"):
+            if column not in columns:
+                self.db.execute("ALTER TABLE pages ADD COLUMN {} TEXT".format(column))
+
+        self.db.commit()
+
+    # Add (key, url) pairs to the crawl. Pages that are already known keep
+    # their current status, unless their URL has changed. Whatever we hold
+    # for those is a copy of some other page, so they start again from
+    # scratch. Keys in `done` are recorded as already fetched
+    def add(self, tasks, done=()):
+        self.db.executemany("""
+            INSERT INTO pages (key, url, status) VALUES (?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET
+                url = excluded.url, status = ?, attempts = 0, retry_after = 0,
+                error = NULL, etag = NULL, last_modified = NULL
+            WHERE url != excluded.url
+            """,
+            ( (str(key), url, FETCHED if str(key) in done else PENDING, PENDING) for key, url in tasks )
+        )
+        self.db.commit()
+
+    # Pages still to be fetched. Pages waiting on a retry are included once
+    # their retry time has passed, failed pages only when asked for
+    def pending(self, retry_failed=False):
+        statuses = (PENDING, RETRY, FAILED) if retry_failed else (PENDING, RETRY)
+        rows = self.db.execute(
+            "SELECT key, url FROM pages WHERE status IN ({}) AND retry_after <= ? ORDER BY rowid".format(",".join("?" * len(statuses))),
+            statuses + (time.time(),)
+        )
+        return rows.fetchall()
+
+    def status(self, key):
+        row = self.db.execute("SELECT status FROM pages WHERE key = ?", (str(key),)).fetchone()
+        return row[0] if row != None else None
+
+    def validators(self, key):
+        row = self.db.execute("SELECT etag, last_modified FROM pages WHERE key = ?", (str(key),)).fetchone()
+        if row == None or row == (None, None):
+            return None
+        return row
+
+    def missing(self):
+        rows = self.db.execute("SELECT key FROM pages WHERE status NOT IN (?, ?) ORDER BY rowid", DONE)
+        return [ row[0] for row in rows ]
+
+    # Queue every page we already hold for fetching again. Their validators are
+    # kept, so pages that have not changed cost a 304 rather than a download
+    def recrawl(self):
+        self.db.execute("UPDATE pages SET status = ? WHERE status IN (?, ?)", (PENDING,) + DONE)
+        self.db.commit()
+
+    def counts(self):
+        return dict(self.db.execute("SELECT status, COUNT(*) FROM pages GROUP BY status"))
+
+    def mark_fetched(self, key, etag=None, last_modified=None):
+        self.__update(key, FETCHED, 0, None, (etag, last_modified))
+
+    def mark_unchanged(self, key, etag=None, last_modified=None):
+        self.__update(key, UNCHANGED, 0, None, (etag, last_modified))
+
+    def mark_failed(self, key, error=None):
+        self.__update(key, FAILED, 0, error)
+
+    def mark_retry(self, key, delay, error=None):
+        self.__update(key, RETRY, time.time() + delay, error)
+
+    def __update(self, key, status, retry_after, error, validators=None):
+        if validators == None:
+            self.db.execute(
+                "UPDATE pages SET status = ?, attempts = attempts + 1, retry_after = ?, error = ? WHERE key = ?",
+                (status, retry_after, error, str(key))
+            )
+        else:
+            self.db.execute(
+                "UPDATE pages SET status = ?, attempts = attempts + 1, retry_after = ?, error = ?, etag = ?, last_modified = ? WHERE key = ?",
+                (status, retry_after, error) + validators + (str(key),)
+            )
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+# Writes the links found on each listing page to the links file as the pages
+# arrive. Pages come back from the fetcher in any order, so they are held until
+# every page before them has been written, which keeps the file in the same
+# order as the listing. Links already written are skipped, so duplicates never
+# build up in memory or on disk
+class LinkWriter:
+    def __init__(self, f, first=1):
+        self.f       = f
+        self.next    = first
+        self.waiting = {}
+        self.seen    = set()
+        self.written = 0
+
+    def put(self, page, links):
+        self.waiting[page] = links
+        self.__write()
+
+    # A page that could not be fetched writes nothing, but no longer holds up
+    # the pages after it
+    def skip(self, page):
+        self.put(page, [])
+
+    def __write(self):
+        while self.next in self.waiting:
+            for link in self.waiting.pop(self.next):
+                if link not in self.seen:
+                    self.seen.add(link)
+                    self.f.write("{}\n".format(link))
+                    self.written += 1
+            self.next += 1
+
+        self.f.flush()
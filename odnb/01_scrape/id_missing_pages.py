@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+import sys
+
+from frontier import CrawlFrontier
+
+# Lists every page in the crawl state kept by scrape.py that has not been
+# fetched, by article ID
+def main(args):
+    if len(args) != 1:
+        print("usage: id_missing_pages.py CRAWL_DB", file=sys.stderr)
+        sys.exit(2)
+
+    frontier = CrawlFrontier(args[0])
+    missing = frontier.missing()
+    frontier.close()
+    print("\n".join(missing))
+
+if __name__=="__main__":
+    main(sys.argv[1:])
@@ -2,20 +2,137 @@
 
 import os
 import sys
+import functools
+import multiprocessing
+from optparse import OptionParser
 
-from bs4 import BeautifulSoup
+import lxml.html
+
+from pagestore import PageStore
+
+# li elements with "doi" among their classes, as matched by find_all("li", {"class":"doi"})
+doi_items = "//li[contains(concat(' ', normalize-space(@class), ' '), ' doi ')]"
+
+def find_dois(page):
+    # Most of the page never needs parsing if it has no DOI in it at all
+    if b"doi" not in page:
+        return []
+
+    tree = lxml.html.fromstring(page)
+    return [ e.text_content() for e in tree.xpath(doi_items) ]
+
+# Page store opened by each worker process the first time it needs a page
+store = None
+
+def index_page(store_path, page):
+    global store
+
+    if store_path == None:
+        docid = os.path.splitext(os.path.basename(page))[0]
+        with open(page, "rb") as f:
+            content = f.read()
+    else:
+        if store == None:
+            store = PageStore(store_path)
+        docid = page
+        content = store.get(page).encode("utf-8")
+
+    return docid, find_dois(content)
+
+def format_row(docid, dois):
+    uri = "NONE"
+    if len(dois) > 0:
+        uri = "\t".join(dois)
+    return "{}\t{}".format(docid, uri)
+
+# Loads an index written by this script into a dict of article ID -> DOIs.
+# Articles without a DOI map to an empty list
+def load_dois(fname):
+    index = {}
+    with open(fname, "r") as f:
+        for line in f:
+            docid, *dois = line.rstrip("\n").split("\t")
+            index[docid] = [] if dois == ["NONE"] else dois
+    return index
+
+def process_args():
+    parser = OptionParser(usage="usage: %prog [options] FILE ...")
+
+    parser.add_option("-o", "--output",
+        action="store", type="string", dest="output", default=None,
+        help="file to which the index should be written (standard output if not given)"
+    )
+
+    parser.add_option("-u", "--update",
+        action="store_true", dest="update", default=False,
+        help="add to the existing index, only reading pages that are new or have changed since it was written"
+    )
+
+    parser.add_option("-p", "--processes",
+        action="store", type="int", dest="processes", default=4,
+        help="number of parallel processes to use"
+    )
+
+    parser.add_option("-s", "--store",
+        action="store", type="string", dest="store", default=None,
+        help="read the pages from this page store rather than from files"
+    )
+
+    options, args = parser.parse_args()
+
+    if options.update and options.output == None:
+        parser.error("--update needs the index to be given with --output")
+
+    if options.store != None and len(args) == 0:
+        args = PageStore(options.store).keys()
+
+    return options, args
+
+# Reads the pages in a pool of worker processes, or in this one if only one
+# process is asked for, yielding their DOIs in page order
+def indexed_pages(find, pages, processes):
+    if processes < 2:
+        yield from map(find, pages)
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            yield from pool.imap(find, pages, chunksize=64)
 
 def main():
+    options, pages = process_args()
+
+    index = {}
+    if options.update and os.path.exists(options.output):
+        index = load_dois(options.output)
+
+        # Files modified after the index was last written are read again
+        if options.store == None:
+            written = os.path.getmtime(options.output)
+            changed = lambda page: os.path.getmtime(page) > written
+            docid = lambda page: os.path.splitext(os.path.basename(page))[0]
+            pages = [ page for page in pages if docid(page) not in index or changed(page) ]
+        else:
+            pages = [ page for page in pages if page not in index ]
+
+    find = functools.partial(index_page, options.store)
+
+    found = indexed_pages(find, pages, options.processes)
+
+    if options.output == None:
+        for docid, dois in found:
+            print(format_row(docid, dois))
+        return
+
+    for docid, dois in found:
+        index[docid] = dois
 
-    for fname in sys.argv[1:]:
-        soup = BeautifulSoup(open(fname), "html.parser")
-        docid = os.path.splitext(os.path.basename(fname))[0]
-        elements = soup.find_all("li", {"class":"doi"})
+    # Written to one side and moved into place so a failed run never leaves a
+    # half written index behind
+    with open(options.output + ".tmp", "w") as f:
+        for docid, dois in index.items():
+            f.write("{}\n".format(format_row(docid, dois)))
+    os.replace(options.output + ".tmp", options.output)
 
-        uri = "NONE"
-        if len(elements) > 0:
-            uri = "\t".join([ e.text for e in elements ])
-        print( "{}\t{}".format(docid, uri) )
+    print("{} pages read, {} articles in {}".format(len(pages), len(index), options.output), file=sys.stderr)
 
 if __name__ == "__main__":
     main()
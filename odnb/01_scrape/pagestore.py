@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+import os
+import gzip
+
+SHARD_SIZE = 1 << 30
+
+# Archive of raw pages. Pages are gzip compressed and appended to a handful of
+# large shard files (pages-000.gz, pages-001.gz, ...) instead of being written
+# out as one small file each. Every shard is a valid multi-member gzip file,
+# so `zcat` still works on it. index.tsv records where each page lives:
+#
+#   key <TAB> url <TAB> shard <TAB> offset <TAB> length
+#
+# The index is append-only. When a page is stored a second time, the newer
+# entry replaces the older one. The whole index is loaded into a dict on
+# open, so finding any page is a dictionary lookup and a single read
+class PageStore:
+    def __init__(self, path, mode="r", shard_size=SHARD_SIZE):
+        self.path       = path
+        self.mode       = mode
+        self.shard_size = shard_size
+        self.index      = {}
+        self.readers    = {}
+        self.shard      = None
+        self.index_file = None
+
+        if mode == "a":
+            os.makedirs(path, exist_ok=True)
+
+        self.__load_index()
+
+        if mode == "a":
+            shards = [ shard for shard, _, _, _ in self.index.values() ]
+            self.__open_shard(max(shards) if len(shards) > 0 else 0)
+            self.__trim_index()
+            self.index_file = open(os.path.join(path, "index.tsv"), "a")
+
+    def __load_index(self):
+        fname = os.path.join(self.path, "index.tsv")
+        if not os.path.exists(fname):
+            return
+
+        with open(fname, "r") as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                # A partial last line is left behind if a write was interrupted
+                if len(parts) != 5:
+                    continue
+                key, url, shard, offset, length = parts
+                self.index[key] = (int(shard), int(offset), int(length), url)
+
+    # Cuts a partial last line off the index. Appended to, the next entry would
+    # run on from it and be skipped along with it the next time the index is
+    # loaded. Only the end of the index is read, however large it is
+    def __trim_index(self):
+        fname = os.path.join(self.path, "index.tsv")
+        if not os.path.exists(fname):
+            return
+
+        with open(fname, "r+b") as f:
+            end = f.seek(0, os.SEEK_END)
+            while end > 0:
+                start = max(0, end - 4096)
+                f.seek(start)
+                newline = f.read(end - start).rfind(b"\n")
+                if newline != -1:
+                    f.truncate(start + newline + 1)
+                    return
+                end = start
+            f.truncate(0)
+
+    def __shard_name(self, shard):
+        return os.path.join(self.path, "pages-{:03}.gz".format(shard))
+
+    def __open_shard(self, shard):
+        if self.shard != None:
+            self.shard.close()
+        self.shard_id = shard
+        self.shard = open(self.__shard_name(shard), "ab")
+
+    def put(self, key, html, url=""):
+        data = gzip.compress(html.encode("utf-8"), mtime=0)
+
+        if self.shard.tell() > 0 and self.shard.tell() + len(data) > self.shard_size:
+            self.__open_shard(self.shard_id + 1)
+
+        offset = self.shard.tell()
+        self.shard.write(data)
+        self.shard.flush()
+
+        # The index entry is only written once the page is safely in the shard
+        key = str(key)
+        self.index[key] = (self.shard_id, offset, len(data), url)
+        self.index_file.write("{}\t{}\t{}\t{}\t{}\n".format(key, url, self.shard_id, offset, len(data)))
+        self.index_file.flush()
+
+    def __read(self, shard, offset, length):
+        if shard not in self.readers:
+            self.readers[shard] = open(self.__shard_name(shard), "rb")
+
+        # pread leaves the file position alone, so a store opened before a
+        # fork can still be read safely from every child process
+        data = os.pread(self.readers[shard].fileno(), length, offset)
+        return gzip.decompress(data).decode("utf-8")
+
+    def get(self, key):
+        shard, offset, length, _ = self.index[str(key)]
+        return self.__read(shard, offset, length)
+
+    def url(self, key):
+        return self.index[str(key)][3]
+
+    def keys(self):
+        return list(self.index.keys())
+
+    # Streams every page in the store as (key, html) pairs. Pages are visited
+    # in the order they sit on disk so each shard is read front to back
+    def items(self):
+        entries = sorted(self.index.items(), key=lambda entry: entry[1][:2])
+        for key, (shard, offset, length, _) in entries:
+            yield key, self.__read(shard, offset, length)
+
+    def __contains__(self, key):
+        return str(key) in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def close(self):
+        for f in self.readers.values():
+            f.close()
+        self.readers = {}
+
+        if self.shard != None:
+            self.shard.close()
+            self.index_file.close()
+            self.shard = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -1,42 +1,219 @@
 #!/usr/bin/env python3
-import random
-import urllib.parse
-import urllib.request
-import sys
+import os
+import asyncio
+import concurrent.futures
+import re
 import xml.etree.ElementTree as ET
-from bs4 import BeautifulSoup
+from optparse import OptionParser
+
+from metrics import CrawlMetrics
+from fetcher import FetchEngine, retry_delay
+from frontier import CrawlFrontier
+from pagestore import PageStore
+from extract_article import clean_article, normalize
+
+# Runs in the cleaning processes
+def clean_page(content):
+    return normalize(clean_article(content))
 
 seed = "http://www.oxforddnb.com"
 
-def fetch(link):
+# Article IDs as they appear in the listing links: /view/article/10030 on the
+# old site and .../odnb-9780198614128-e-10030 on the current one
+article_ids = [
+    re.compile(r"odnb-\d+-e-(\d+)"),
+    re.compile(r"/view/article/(\d+)"),
+    re.compile(r"ref:odnb/(\d+)$")
+]
+
+# Pages are saved and tracked under their article ID, which stays the same
+# however the links are ordered, rather than their place in the link list
+def article_id(href):
+    for pattern in article_ids:
+        match = pattern.search(href)
+        if match != None:
+            return match.group(1)
+    return None
+
+def scrape(root, links, options):
+    engine = FetchEngine(
+        concurrency = options.concurrency,
+        per_host    = options.per_host,
+        rate        = options.rate,
+        metrics     = CrawlMetrics(options.metrics, options.metrics_interval),
+        method      = "POST",
+        data        = "".encode("ascii")
+    )
+
+    def tasks():
+        for link in links:
+            href = ET.fromstring(link).attrib["href"]
+            article = article_id(href)
+            if article == None:
+                print("No article ID in {}".format(href))
+                continue
+            yield article, root + href
+
+    # Pages are written to a page store when one is given, loose files if not
+    store = PageStore(options.store, "a") if options.store != None else None
+
+    # Pages already on disk from earlier runs are never downloaded again
+    frontier = CrawlFrontier(options.state)
+    frontier.add(tasks(), done=downloaded_pages(store))
+    if options.recrawl:
+        frontier.recrawl()
+    pending = frontier.pending(options.retry_failed)
+
+    # Parsing a page takes long enough to hold up every request in flight, so
+    # pages are cleaned in other processes while the crawl carries on
+    cleaner = concurrent.futures.ProcessPoolExecutor(options.processes) if options.clean else None
+
+    done = 0
+    async def save(article, link, page):
+        nonlocal done
+        done += 1
+        if page.content == None:
+            print("{:5}/{} :: {} (unchanged)".format(done, len(pending), link))
+            frontier.mark_unchanged(article, page.etag, page.last_modified)
+            return
+
+        print("{:5}/{} :: {}".format(done, len(pending), link))
+        content = page.content
+
+        # Clean and normalise the page in memory so it is only written once
+        if options.clean:
+            try:
+                content = await asyncio.get_running_loop().run_in_executor(cleaner, clean_page, content)
+            except AttributeError:
+                print("No article found in {}".format(link))
+                frontier.mark_failed(article, "no article found")
+                return
+            # Any other page the cleaner chokes on fails on its own rather than
+            # stopping the crawl
+            except Exception as e:
+                error = "{}: {}".format(type(e).__name__, e)
+                print("Could not clean {}: {}".format(link, error))
+                frontier.mark_failed(article, error)
+                return
+
+        if store != None:
+            store.put(article, content, link)
+        else:
+            with open("{}.html".format(article), "w") as f:
+                f.write(content)
+        frontier.mark_fetched(article, page.etag, page.last_modified)
+
+    # Only ask for a page to be revalidated if we still have our copy of it
+    def validators(article):
+        if not have_page(store, article):
+            return None
+        return frontier.validators(article)
+
+    def failed(article, link, error):
+        delay = retry_delay(error)
+        if delay == None:
+            frontier.mark_failed(article, str(error))
+        else:
+            frontier.mark_retry(article, delay, str(error))
+
     try:
-        headers = {
-            'User-Agent' : 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_9_3) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/35.0.1916.47 Safari/537.36'
-        }
-        req = urllib.request.Request(link, "".encode("ascii"), headers)
-        handler = urllib.request.urlopen( req )        
-        page = handler.read().decode( 'utf-8' )
-        return page
-    except urllib.error.HTTPError as e:
-        print(e, link)
-
-def scrape(root, links):    
-    for i, link in enumerate(links):
-        print("{:5}/{} :: {}".format(i+1, len(links), links[i]))
-        et = ET.fromstring(link)
-        content = fetch( root + et.attrib["href"] )
-        if content == None:
-            continue
-        with open("{}.html".format(i), "w") as f:
-            f.write(content)
+        engine.run(pending, save, failed, validators)
+    finally:
+        if cleaner != None:
+            cleaner.shutdown()
+        frontier.close()
+        if store != None:
+            store.close()
+
+def downloaded_pages(store):
+    if store != None:
+        return set(store)
+    return { os.path.splitext(f)[0] for f in os.listdir(".") if f.endswith(".html") }
+
+def have_page(store, key):
+    if store != None:
+        return key in store
+    return os.path.exists("{}.html".format(key))
 
 def load_links(fname):
     with open(fname,"r") as f:
         return f.read().split("\n")[:-1]
 
-def main(arg):
-    links = load_links(arg)
-    scrape( seed, links )
+def process_args():
+    parser = OptionParser(usage="usage: %prog [options] LINKS")
+
+    parser.add_option("-c", "--concurrency",
+        action="store", type="int", dest="concurrency", default=32,
+        help="maximum number of requests in flight at once. The number actually in flight adapts to how the server is coping"
+    )
+
+    parser.add_option("--per-host",
+        action="store", type="int", dest="per_host", default=32,
+        help="maximum number of pooled connections to a single host"
+    )
+
+    parser.add_option("-r", "--rate",
+        action="store", type="float", dest="rate", default=0,
+        help="maximum number of requests per second sent to a single host (0 for no fixed cap)"
+    )
+
+    parser.add_option("-d", "--store",
+        action="store", type="string", dest="store", default=None,
+        help="page store directory to which pages are written instead of loose files"
+    )
+
+    parser.add_option("--clean",
+        action="store_true", dest="clean", default=False,
+        help="clean and normalise each page as it arrives (extract_article.py -f)"
+    )
+
+    parser.add_option("-p", "--processes",
+        action="store", type="int", dest="processes", default=4,
+        help="number of processes cleaning pages with --clean"
+    )
+
+    parser.add_option("-s", "--state",
+        action="store", type="string", dest="state", default="crawl.db",
+        help="database recording the progress of the crawl"
+    )
+
+    parser.add_option("--recrawl",
+        action="store_true", dest="recrawl", default=False,
+        help="check every page again, downloading only those that have changed"
+    )
+
+    parser.add_option("--retry-failed",
+        action="store_true", dest="retry_failed", default=False,
+        help="try again on pages that failed permanently in earlier runs"
+    )
+
+    parser.add_option("--root",
+        action="store", type="string", dest="root", default=seed,
+        help="site from which the articles are fetched"
+    )
+
+    parser.add_option("-m", "--metrics",
+        action="store", type="string", dest="metrics", default=None,
+        help="file to which crawl metrics are appended as lines of JSON"
+    )
+
+    parser.add_option("--metrics-interval",
+        action="store", type="float", dest="metrics_interval", default=60,
+        help="seconds between metrics snapshots"
+    )
+
+    options, args = parser.parse_args()
+
+    if len(args) < 1:
+        parser.print_help()
+        exit()
+
+    return options, args
+
+def main():
+    options, args = process_args()
+    links = load_links(args[0])
+    scrape( options.root, links, options )
 
 if __name__=="__main__":
-    main(sys.argv[1])
+    main()
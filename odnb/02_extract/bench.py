@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+import gc
+import os
+import sys
+import json
+import time
+import random
+from optparse import OptionParser
+
+import names
+import dates
+import parsers
+from entity_processor import Entity
+from config import MAX_LABELS
+
+# Microbenchmarks for each stage of Entity, run over synthetic articles so
+# they can be run anywhere and always see the same input. Results can be
+# saved as a baseline and later runs compared against it, to catch a change
+# to entity_processor.py or config.py that slows extraction down before it
+# reaches a full run over the corpus
+
+FORENAMES  = [ "John", "Mary", "Thomas", "Hugh", "Gerald", "Éamon", "Pádraig", "William", "Jane", "Charles", "Xpher", "Ann" ]
+SURNAMES   = [ "Smith", "O'Neill", "FitzGerald", "Butler", "Ó Conaill", "Boyle", "Murphy", "Stuart", "de Lacy", "Wolf", "Dacre" ]
+PREFIXES   = [ "Sir", "Lady", "Fr.", "Dr", "Major General", "Colonel Commandant", "Lord", "Rev." ]
+LOCATIONS  = [ "of Kinsale", "of Largs", "of Meath", "of St Andrews", "of Eynsham" ]
+NICKNAMES  = [ "'Jack'", "'Molly'", "'the Rebel'", "'Silken Thomas'", "'Polly'" ]
+WORDS      = [ "the", "king", "was", "born", "in", "and", "his", "<i>father</i>", "&amp;", "–", "‘parish’", "<b>Dublin</b>", "1798" ]
+
+SIMPLE_DATES = [ "1610-1688", "d. 1432", "b. 1760", "1564-1616", "1890-1950" ]
+FUZZY_DATES  = [ "c.1600-1650", "fl. 1250×1260", "1801/2-1870", "1740-92", "c.1700-1785?", "d. 5", "1702×3-1755", "a. 1200-1250", "b. c.1540, d. in or after 1601", "fl. 12" ]
+
+# Every kind of link either dictionary links to, so the same articles work
+# for both
+LINKS = [
+    "/view/10.1093/ref:odnb/9780198614128.001.0001/odnb-9780198614128-e-{}",
+    "https://doi.org/10.1093/odnb/9780198614128.013.{}",
+    "/view/article/{}?docPos=1&ref:odnb/{}",
+    "quickSearch.do?articleId=a{}",
+    "http://example.com/{}"
+]
+
+# Article title with `alternatives` alternative forenames and surnames in
+# brackets, some of them nicknames
+def generate_title(rng, alternatives):
+    surname  = rng.choice(SURNAMES)
+    forename = rng.choice(FORENAMES)
+
+    if rng.random() < 0.5:
+        forename = "{} {}".format(rng.choice(PREFIXES), forename)
+
+    if alternatives > 0:
+        alt_surnames  = rng.sample(SURNAMES, min(alternatives, len(SURNAMES)))
+        alt_forenames = rng.sample(FORENAMES + NICKNAMES, min(alternatives, len(FORENAMES + NICKNAMES)))
+        surname  = "{} ({})".format(surname, "; ".join(alt_surnames))
+        forename = "{} ({})".format(forename, "; ".join(alt_forenames))
+
+    title = "{}, {}".format(surname, forename)
+    if rng.random() < 0.3:
+        title = "{} {}".format(title, rng.choice(LOCATIONS))
+    return title
+
+def generate_article(rng, options):
+    title = generate_title(rng, options.alternatives)
+    date  = rng.choice(FUZZY_DATES if rng.random() < options.fuzzy else SIMPLE_DATES)
+
+    links = []
+    for _ in range(options.links):
+        target = rng.randint(10000, 99999)
+        links.append('<a href="{}">{}  {}</a>'.format(rng.choice(LINKS).format(target, target), rng.choice(FORENAMES), rng.choice(SURNAMES)))
+
+    paragraphs = [ "<p>{} ({}), soldier and politician, was the son of {}.</p>".format(title, date, " ".join(links)) ]
+    for _ in range(options.paragraphs):
+        paragraphs.append("<p>{}</p>".format(" ".join(rng.choice(WORDS) for _ in range(options.words))))
+
+    return '<html><head><meta charset="UTF-8"/><title>{}</title></head><body><h1>{}</h1>\n{}\n</body></html>'.format(
+        title, title, "\n".join(paragraphs))
+
+def generate_articles(options):
+    rng = random.Random(options.seed)
+    return [ (str(10000 + i), generate_article(rng, options)) for i in range(options.articles) ]
+
+# A prepared article. Every stage is timed on its own, so each gets the parsed
+# page and an Entity with everything the earlier stages would have set
+class Prepared:
+    def __init__(self, key, html, max_labels):
+        self.key    = key
+        self.html   = html
+        self.page   = parsers.PARSERS[parsers.DEFAULT_PARSER](html)
+        self.entity = Entity(html, key, max_labels=max_labels)
+
+    # The private stages of Entity, reached through their mangled names
+    def stage(self, name):
+        return getattr(self.entity, "_Entity__" + name)
+
+def extract_names(doc):
+    doc.entity.altnames = []
+    doc.stage("extract_names")()
+    doc.stage("extract_name_parts")()
+
+# name -> function run once per article
+def benchmark_cases(options):
+    cases = {}
+    for parser in sorted(parsers.PARSERS):
+        cases["parse:" + parser] = lambda doc, parse=parsers.PARSERS[parser]: parse(doc.html)
+
+    cases["title"]  = lambda doc: doc.stage("extract_title")(doc.page)
+    cases["links"]  = lambda doc: doc.stage("extract_links")(doc.page)
+    cases["text"]   = lambda doc: doc.stage("extract_text_extracts")(doc.page)
+    cases["dates"]  = lambda doc: doc.stage("extract_born_death_dates")()
+    cases["names"]  = extract_names
+    cases["labels"] = lambda doc: doc.stage("generate_name_permutations")(doc.entity.title, options.max_labels)
+    cases["entity"] = lambda doc: Entity(doc.html, doc.key, parser=options.parser, max_labels=options.max_labels)
+    return cases
+
+# Each pass over the articles starts with the caches emptied, as a fresh
+# worker process would
+def clear_caches():
+    dates.parse.cache_clear()
+    names.collapse_locations.cache_clear()
+    names.collapse_titles_honorifics.cache_clear()
+
+# Garbage collection is held off while timing, as timeit does, so one case is
+# not charged for collecting what an earlier one left behind
+def time_pass(case, docs):
+    clear_caches()
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for doc in docs:
+            case(doc)
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+
+# Stages that only take microseconds an article are run over the articles
+# enough times for each repeat to take at least MIN_TIME seconds, so the
+# timings are not swamped by noise
+MIN_TIME = 0.2
+
+def run_case(case, docs, repeat):
+    first = time_pass(case, docs)
+    passes = max(1, int(MIN_TIME / first)) if first > 0 else 1
+
+    best = None
+    for _ in range(repeat):
+        elapsed = sum( time_pass(case, docs) for _ in range(passes) ) / passes
+        best = elapsed if best == None else min(best, elapsed)
+
+    return {
+        "seconds"     : round(best, 4),
+        "ops_per_sec" : round(len(docs) / best, 1) if best > 0 else None
+    }
+
+# Compares results against a baseline. Returns the cases that got slower by
+# more than `tolerance`, as a fraction of their baseline ops/sec
+def compare(results, baseline, tolerance, f=sys.stdout):
+    if results["settings"] != baseline["settings"]:
+        print("warning: baseline was run with different settings: {}".format(json.dumps(baseline["settings"])), file=f)
+
+    slower = []
+    print("{:<12} {:>12} {:>12} {:>8}".format("case", "baseline", "now", "change"), file=f)
+    for name, result in results["cases"].items():
+        if name not in baseline["cases"]:
+            continue
+        before = baseline["cases"][name]["ops_per_sec"]
+        after  = result["ops_per_sec"]
+        change = after / before - 1
+        flag = ""
+        if change < -tolerance:
+            slower.append(name)
+            flag = "  SLOWER"
+        print("{:<12} {:>12.1f} {:>12.1f} {:>+7.1f}%{}".format(name, before, after, change * 100, flag), file=f)
+
+    return slower
+
+# Also gives parity.py the settings of its synthetic articles
+def option_parser():
+    parser = OptionParser(usage="usage: %prog [options]")
+
+    parser.add_option("-n", "--articles",
+        action="store", type="int", dest="articles", default=500,
+        help="number of synthetic articles to generate"
+    )
+
+    parser.add_option("--paragraphs",
+        action="store", type="int", dest="paragraphs", default=8,
+        help="paragraphs of filler text in each article after the first"
+    )
+
+    parser.add_option("--words",
+        action="store", type="int", dest="words", default=80,
+        help="words in each paragraph of filler text"
+    )
+
+    parser.add_option("--links",
+        action="store", type="int", dest="links", default=6,
+        help="links in the first paragraph of each article"
+    )
+
+    parser.add_option("--alternatives",
+        action="store", type="int", dest="alternatives", default=2,
+        help="alternative forenames and surnames in brackets in each title"
+    )
+
+    parser.add_option("--fuzzy",
+        action="store", type="float", dest="fuzzy", default=0.5,
+        help="fraction of articles with fuzzy life dates like c.1600-1650 or fl. 1250×1260"
+    )
+
+    parser.add_option("--seed",
+        action="store", type="int", dest="seed", default=0,
+        help="seed for generating the articles"
+    )
+
+    parser.add_option("-r", "--repeat",
+        action="store", type="int", dest="repeat", default=5,
+        help="times to run each case. The fastest run is reported"
+    )
+
+    parser.add_option("-k", "--cases",
+        action="store", type="string", dest="cases", default=None,
+        help="comma separated cases to run (all by default)"
+    )
+
+    parser.add_option("--parser",
+        action="store", type="choice", dest="parser", default=parsers.DEFAULT_PARSER,
+        choices=sorted(parsers.PARSERS),
+        help="HTML parser for the entity case"
+    )
+
+    parser.add_option("--max-labels",
+        action="store", type="int", dest="max_labels", default=MAX_LABELS,
+        help="most labels to generate for any one entity"
+    )
+
+    parser.add_option("-w", "--write",
+        action="store", type="string", dest="write", default=None,
+        help="write the articles to this directory, for running extract.py over, and stop"
+    )
+
+    parser.add_option("--save",
+        action="store", type="string", dest="save", default=None,
+        help="save the results to this file as a baseline"
+    )
+
+    parser.add_option("--compare",
+        action="store", type="string", dest="compare", default=None,
+        help="compare the results against a baseline saved with --save"
+    )
+
+    parser.add_option("--tolerance",
+        action="store", type="float", dest="tolerance", default=0.1,
+        help="fraction by which a case can be slower than the baseline before it counts as a regression"
+    )
+
+    return parser
+
+def process_args():
+    return option_parser().parse_args()
+
+def main():
+    options, _ = process_args()
+
+    articles = generate_articles(options)
+
+    if options.write != None:
+        os.makedirs(options.write, exist_ok=True)
+        for key, html in articles:
+            with open(os.path.join(options.write, key + ".html"), "w") as f:
+                f.write(html)
+        print("{} articles written to {}".format(len(articles), options.write), file=sys.stderr)
+        return
+
+    docs = [ Prepared(key, html, options.max_labels) for key, html in articles ]
+
+    cases = benchmark_cases(options)
+    if options.cases != None:
+        selected = options.cases.split(",")
+        unknown = [ name for name in selected if name not in cases ]
+        if len(unknown) > 0:
+            sys.exit("unknown cases: {} (choose from {})".format(", ".join(unknown), ", ".join(cases)))
+        cases = { name : cases[name] for name in selected }
+
+    settings = { name : getattr(options, name) for name in [ "articles", "paragraphs", "words", "links", "alternatives", "fuzzy", "seed", "parser", "max_labels" ] }
+    results = { "settings" : settings, "cases" : {} }
+
+    for name, case in cases.items():
+        result = run_case(case, docs, options.repeat)
+        results["cases"][name] = result
+        print("{:<12} {:>12.1f} ops/sec {:>10.4f}s".format(name, result["ops_per_sec"], result["seconds"]))
+
+    if options.save != None:
+        with open(options.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if options.compare != None:
+        with open(options.compare, "r") as f:
+            baseline = json.load(f)
+        print()
+        slower = compare(results, baseline, options.tolerance)
+        if len(slower) > 0:
+            print("{} slower than the baseline: {}".format(len(slower), ", ".join(slower)), file=sys.stderr)
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
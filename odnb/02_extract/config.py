@@ -92,4 +92,9 @@ NORMALS = [
 	(r"(?i)(second) (lieutenant)", r"\1-\2"),
 	(r"(?i)(sergeant-major) (major)", r"\1-\2"),
 	(r"(?i)(sergeant-major'?s) (major)", r"\1-\2"),
-]
\ No newline at end of file
+]
+
+# Most labels generated for any one entity. A title with many alternative
+# names in brackets otherwise gives a label for every combination of them.
+# None for no limit
+MAX_LABELS = None
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+import sys
+import heapq
+import pstats
+import cProfile
+
+# Gathers the time each article spent in every stage of Entity, as timed by
+# the worker processes, into one report for the whole run. Every timing is
+# kept so the percentiles are exact; that is a handful of floats an article
+class StageProfile:
+    def __init__(self, slowest=10):
+        self.slowest  = slowest
+        self.timings  = {}
+        self.heaviest = {}
+        self.articles = []
+        self.count    = 0
+
+    def add(self, key, timings):
+        self.count += 1
+        for stage, seconds in timings.items():
+            self.timings.setdefault(stage, []).append(seconds)
+            self.__keep(self.heaviest.setdefault(stage, []), seconds, key)
+        self.__keep(self.articles, sum(timings.values()), key)
+
+    # Holds on to the `slowest` articles seen so far, in a min heap
+    def __keep(self, heap, seconds, key):
+        if len(heap) < self.slowest:
+            heapq.heappush(heap, (seconds, key))
+        elif seconds > heap[0][0]:
+            heapq.heapreplace(heap, (seconds, key))
+
+    # The slowest articles overall, slowest first, as (seconds, key) pairs
+    def slowest_articles(self, n=None):
+        return sorted(self.articles, reverse=True)[:n]
+
+    def report(self, f=sys.stderr):
+        if self.count == 0:
+            return
+
+        total = sum( sum(timings) for timings in self.timings.values() )
+        ms = lambda seconds: "{:.2f}".format(seconds * 1000)
+
+        print("{} articles profiled, {:.2f}s in Entity".format(self.count, total), file=f)
+        print("{:<18} {:>9} {:>6} {:>8} {:>8} {:>8} {:>8} {:>8}  {}".format(
+            "stage", "total s", "share", "mean ms", "p50 ms", "p90 ms", "p99 ms", "max ms", "slowest"), file=f)
+
+        for stage, timings in sorted(self.timings.items(), key=lambda item: -sum(item[1])):
+            timings = sorted(timings)
+            stage_total = sum(timings)
+            heaviest = sorted(self.heaviest[stage], reverse=True)[:3]
+            print("{:<18} {:>9.2f} {:>5.1f}% {:>8} {:>8} {:>8} {:>8} {:>8}  {}".format(
+                stage,
+                stage_total,
+                100 * stage_total / total if total > 0 else 0,
+                ms(stage_total / len(timings)),
+                ms(percentile(timings, 50)),
+                ms(percentile(timings, 90)),
+                ms(percentile(timings, 99)),
+                ms(timings[-1]),
+                ", ".join( "{} ({}ms)".format(key, ms(seconds)) for seconds, key in heaviest )
+            ), file=f)
+
+        print("slowest articles: {}".format(
+            ", ".join( "{} ({}ms)".format(key, ms(seconds)) for seconds, key in self.slowest_articles() )), file=f)
+
+# Nearest rank percentile of a sorted list
+def percentile(values, p):
+    rank = max(0, min(len(values) - 1, int(round(p / 100.0 * len(values))) - 1))
+    return values[rank]
+
+# Runs `extract` again on each of the given articles under cProfile and writes
+# the combined stats to `output`, where pstats or snakeviz can read them. The
+# functions the most time was spent under are printed as well
+def profile_articles(extract, keys, output, f=sys.stderr, limit=20):
+    profiler = cProfile.Profile()
+    for key in keys:
+        profiler.runcall(extract, key)
+    profiler.dump_stats(output)
+
+    print("cProfile stats for {} articles written to {}".format(len(keys), output), file=f)
+    pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(limit)
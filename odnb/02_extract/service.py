@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import stat
+import tarfile
+import zipfile
+import time
+import signal
+import logging
+import functools
+import threading
+import socketserver
+import multiprocessing
+from collections import deque
+
+import sources
+from profiling import percentile
+
+# Keeps extract.py running as a service (extract.py --serve) for extracting a
+# few articles at a time as they are revised. Starting extract.py for each
+# handful pays for starting the interpreter, the imports and the pool of worker
+# processes every time, which takes far longer than the extraction itself. The
+# service pays for them once and keeps its workers warm between requests.
+#
+# Requests are JSON objects, one per line, read from stdin or from clients of
+# a Unix socket. A request names the articles to extract by path, taken the
+# same way as extract.py's arguments (or as keys of the page store, with -s),
+# or sends them as HTML along with their article IDs, or both:
+#
+#   {"id": "r1", "paths": ["pages/10030.html"], "pages": [{"article_id": "10194", "html": "<html>..."}]}
+#
+# Every request gets a line in reply, in the order the requests came in. It
+# holds the entity records just as extract.py writes them, any articles that
+# could not be extracted, and how long the request took:
+#
+#   {"id": "r1", "stats": {"articles": 2, "latency_ms": 4.2, "extract_ms": 5.1, "slowest_ms": 3.0}, "errors": [], "entities": [...]}
+#
+# `latency_ms` is the time from the request being read to its reply being
+# ready, `extract_ms` the time the workers spent on its articles and
+# `slowest_ms` the longest any one of them took. Requests that aren't valid
+# JSON, or aren't shaped like the above, get an "error" in place of entities
+
+# Extracted by each worker as it starts, so the first request it takes doesn't
+# pay for filling the caches and anything imported lazily
+WARM_UP_PAGE = sources.Page("warm-up",
+    "<html><head><title>Smith, John (c. 1600-1650)</title></head><body>"
+    "<p>Smith, John (c. 1600-1650), bishop, was born in <a href=\"#\">York</a>.</p>"
+    "</body></html>")
+
+# Number of the most recent requests whose latencies go into the report
+LATENCY_WINDOW = 10000
+
+# Runs in the worker processes. An article that fails is reported in the reply
+# rather than taking the request, or the service, down with it
+def served_record(extract, task):
+    start = time.perf_counter()
+    try:
+        record, error = extract(task), None
+    except Exception as e:
+        record, error = None, "{}: {}".format(type(e).__name__, e)
+    return record, error, time.perf_counter() - start
+
+def warm_up(extract):
+    served_record(extract, WARM_UP_PAGE)
+
+# Runs in each worker process as it starts. Ctrl-C is left to the service
+# itself, which shuts the workers down
+def start_worker(extract):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    warm_up(extract)
+
+def stop(signum, frame):
+    raise KeyboardInterrupt()
+
+class BadRequest(Exception):
+    pass
+
+# `extract` runs in the worker processes and turns an input into its entity
+# record. `expand` runs in the service and turns the paths of a request into
+# inputs
+class Service:
+    def __init__(self, extract, expand, processes=4):
+        self.extract   = functools.partial(served_record, extract)
+        self.expand    = expand
+        self.pool      = None
+        self.lock      = threading.Lock()
+        self.start     = time.time()
+        self.requests  = 0
+        self.articles  = 0
+        self.errors    = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+        if processes < 2:
+            warm_up(extract)
+        else:
+            self.pool = multiprocessing.Pool(processes, start_worker, (extract,))
+
+    def close(self):
+        if self.pool != None:
+            self.pool.terminate()
+            self.pool.join()
+
+    # Serves requests from stdin, or from a Unix socket if one is given, until
+    # stdin is closed or the service is stopped with Ctrl-C or SIGTERM
+    def serve(self, path=None):
+        signal.signal(signal.SIGTERM, stop)
+        try:
+            if path == None:
+                self.serve_stream(sys.stdin, sys.stdout)
+            else:
+                self.serve_socket(path)
+        except KeyboardInterrupt:
+            pass
+
+    # The requests on a stream are answered one at a time, in order
+    def serve_stream(self, requests, replies):
+        for line in requests:
+            if len(line.strip()) > 0:
+                replies.write("{}\n".format(self.handle(line)))
+                replies.flush()
+
+    # Each client of the socket is served by a thread of its own, all of them
+    # sharing the one pool of workers
+    def serve_socket(self, path):
+        # A socket left behind by a service that didn't shut down cleanly
+        if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+            os.remove(path)
+
+        server = socketserver.ThreadingUnixStreamServer(path, SocketHandler)
+        server.daemon_threads = True
+        server.service = self
+        logging.info("Listening on {}".format(path))
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            os.remove(path)
+
+    # Extracts the articles of one request and returns the reply as a line of
+    # JSON
+    def handle(self, line):
+        start = time.perf_counter()
+        request = {}
+        try:
+            request = json.loads(line)
+            tasks, errors = self.__tasks(request)
+        except (ValueError, BadRequest) as e:
+            request_id = request.get("id") if isinstance(request, dict) else None
+            return json.dumps({ "id": request_id, "error": "bad request: {}".format(e) })
+
+        if self.pool != None:
+            results = self.pool.map(self.extract, tasks, chunksize=1)
+        else:
+            results = [ self.extract(task) for task in tasks ]
+
+        # Paths that couldn't be read count as an article each
+        articles = len(tasks) + len(errors)
+        records = [ record for record, _, _ in results if record != None ]
+        errors += [ { "article": sources.name(task), "error": error } for task, (_, error, _) in zip(tasks, results) if error != None ]
+        seconds = [ elapsed for _, _, elapsed in results ]
+        latency = time.perf_counter() - start
+
+        self.__add(request.get("id"), latency, articles, len(errors))
+
+        stats = {
+            "articles"   : articles,
+            "latency_ms" : round(latency * 1000, 3),
+            "extract_ms" : round(sum(seconds) * 1000, 3),
+            "slowest_ms" : round(max(seconds, default=0) * 1000, 3)
+        }
+        # The entity records are JSON already and go into the reply as they are
+        return "{{\"id\": {}, \"stats\": {}, \"errors\": {}, \"entities\": [{}]}}".format(
+            json.dumps(request.get("id")), json.dumps(stats), json.dumps(errors), ", ".join(records))
+
+    def __tasks(self, request):
+        if not isinstance(request, dict):
+            raise BadRequest("expected a JSON object")
+
+        paths = request.get("paths", [])
+        pages = request.get("pages", [])
+        if not isinstance(paths, list) or not all( isinstance(path, str) for path in paths ):
+            raise BadRequest("\"paths\" should be a list of paths")
+        if not isinstance(pages, list) or not all( isinstance(page, dict) and isinstance(page.get("article_id"), str) and isinstance(page.get("html"), str) for page in pages ):
+            raise BadRequest("\"pages\" should be a list of objects with an \"article_id\" and \"html\"")
+
+        # A path that can't be read, or an archive that is corrupt, fails on
+        # its own like an article that can't be extracted. Members read out of
+        # an archive before it turned out to be corrupt are still extracted
+        tasks = []
+        errors = []
+        for path in paths:
+            try:
+                tasks += self.expand([ path ])
+            except (OSError, EOFError, tarfile.TarError, zipfile.BadZipFile) as e:
+                errors.append({ "article": path, "error": "{}: {}".format(type(e).__name__, e) })
+
+        return tasks + [ sources.Page(page["article_id"], page["html"]) for page in pages ], errors
+
+    def __add(self, request_id, latency, articles, errors):
+        logging.info("Request {}: {} articles in {:.1f}ms".format(request_id, articles, latency * 1000))
+        with self.lock:
+            self.requests += 1
+            self.articles += articles
+            self.errors   += errors
+            self.latencies.append(latency)
+
+    def report(self, f=sys.stderr):
+        print("{} requests, {} articles ({} failed) in {:.1f}s".format(
+            self.requests, self.articles, self.errors, time.time() - self.start), file=f)
+
+        if len(self.latencies) > 0:
+            latencies = sorted(self.latencies)
+            print("latency p50 {:.1f}ms, p90 {:.1f}ms, p99 {:.1f}ms, max {:.1f}ms over the last {} requests".format(
+                *( percentile(latencies, p) * 1000 for p in [50, 90, 99] ), latencies[-1] * 1000, len(latencies)), file=f)
+
+class SocketHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if len(line.strip()) > 0:
+                self.wfile.write("{}\n".format(self.server.service.handle(line)).encode("utf-8"))
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+import os
+import glob
+import gzip
+import fnmatch
+import tarfile
+import zipfile
+import tempfile
+from collections import namedtuple
+
+# Finds the articles to extract from the inputs given on the command line.
+# An input can be a file, a directory, a glob pattern, a tar archive (.tar,
+# .tar.gz, .tgz, .tar.bz2, .tar.xz), a zip archive or a single gzipped file.
+# Inputs are expanded lazily, one at a time, so extraction can start on the
+# first articles while later ones are still being found.
+#
+# Plain files are given as their path and read by whichever worker process
+# extracts them. Articles inside archives are read out here and given as a
+# Member, holding the article's contents, so archives never have to be
+# unpacked to disk. The name of a member is the archive path joined to its
+# path inside the archive, so the article ID still comes from its file name.
+# `stamp` changes whenever the member does, for incremental runs
+Member = namedtuple("Member", ["name", "data", "stamp"])
+
+# An archive member set aside in a spool file until it is extracted, so that
+# holding on to it costs its place in the spool rather than its contents
+Spooled = namedtuple("Spooled", ["name", "spool", "offset", "size", "stamp"])
+
+# An article sent to the extraction service as HTML, with its article ID
+# given rather than taken from a file name
+Page = namedtuple("Page", ["article_id", "html"])
+
+TAR_EXTENSIONS = [ ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz" ]
+
+def is_glob(arg):
+    return any( c in arg for c in "*?[" ) and not os.path.exists(arg)
+
+def is_tar(path):
+    return any( path.endswith(extension) for extension in TAR_EXTENSIONS )
+
+def expand(args, members="*"):
+    for arg in args:
+        if is_glob(arg):
+            yield from expand(glob.iglob(arg, recursive=True), members)
+        elif os.path.isdir(arg):
+            with os.scandir(arg) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        yield from expand([ entry.path ], members)
+        elif is_tar(arg):
+            yield from tar_members(arg, members)
+        elif arg.endswith(".zip"):
+            yield from zip_members(arg, members)
+        elif arg.endswith(".gz"):
+            yield gzip_member(arg)
+        else:
+            yield arg
+
+# Tar archives are read front to back as a stream, which is the only quick
+# way through a compressed tarball
+def tar_members(path, members):
+    with tarfile.open(path, "r|*") as tar:
+        for info in tar:
+            if info.isfile() and fnmatch.fnmatch(os.path.basename(info.name), members):
+                data = tar.extractfile(info).read()
+                yield Member(os.path.join(path, os.path.normpath(info.name)), data, "{}:{}".format(info.size, info.mtime))
+
+def zip_members(path, members):
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if not info.is_dir() and fnmatch.fnmatch(os.path.basename(info.filename), members):
+                yield Member(os.path.join(path, os.path.normpath(info.filename)), archive.read(info), "{}:{}".format(info.file_size, info.CRC))
+
+def gzip_member(path):
+    stat = os.stat(path)
+    with gzip.open(path, "rb") as f:
+        return Member(path[:-len(".gz")], f.read(), "{}:{}".format(stat.st_size, stat.st_mtime_ns))
+
+# Temporary file holding archive members that have been found but are not
+# wanted yet. The workers read them back by their offset
+class Spool:
+    def __init__(self):
+        self.file = tempfile.NamedTemporaryFile(prefix="extract-", suffix=".spool")
+
+    def add(self, member):
+        offset = self.file.tell()
+        self.file.write(member.data)
+        return Spooled(member.name, self.file.name, offset, len(member.data), member.stamp)
+
+    # Members added so far are only visible to other processes after this
+    def flush(self):
+        self.file.flush()
+
+    # The spool file is deleted when it is closed
+    def close(self):
+        self.file.close()
+
+def unspool(task):
+    with open(task.spool, "rb") as f:
+        f.seek(task.offset)
+        return Member(task.name, f.read(task.size), task.stamp)
+
+# Name by which an input is known in logs, reports and manifests
+def name(task):
+    if isinstance(task, Page):
+        return task.article_id
+    return task.name if isinstance(task, (Member, Spooled)) else task
+
+def read(task):
+    if isinstance(task, Member):
+        return task.data
+    if isinstance(task, Spooled):
+        return unspool(task).data
+    if isinstance(task, Page):
+        return task.html.encode("utf-8") if isinstance(task.html, str) else task.html
+    with open(task, "rb") as f:
+        return f.read()
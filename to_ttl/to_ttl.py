@@ -1,10 +1,10 @@
 #!/usr/bin/env python3
 import json
 from optparse import OptionParser
-from rdflib import Graph, Namespace, URIRef, Literal
-from rdflib.namespace import RDF, FOAF, RDFS, NamespaceManager
 from datetime import date
 
+# rdflib is slow to import, so it is imported by the methods that build the
+# graph rather than up front, and the arguments are checked without it
 class App:
 	def __init__(self):
 		
@@ -49,6 +49,9 @@ class App:
 			parser.print_help()
 
 	def __initialize_graph(self):
+		from rdflib import Graph, Namespace
+		from rdflib.namespace import FOAF, NamespaceManager
+
 		self.dbo = Namespace("http://dbpedia.org/ontology/")		
 		self.owl = Namespace("http://www.w3.org/2002/07/owl#")
 		self.crm = Namespace("http://www.cidoc-crm.org/cidoc-crm/")
@@ -67,6 +70,8 @@ class App:
 		self.graph.namespace_manager = namespace_manager
 
 	def __load_data(self):
+		from rdflib import URIRef
+
 		self.entities = {}
 		with open(self.args[0], "r") as f:
 			for line in f:
@@ -82,6 +87,9 @@ class App:
 				self.entities[entity["article_id"]] = entity
 
 	def __create_or_add_timespan( self, start_year, end_year ):
+		from rdflib import URIRef, Literal
+		from rdflib.namespace import RDF
+
 		start = date(start_year, 1, 1).strftime('%Y-%m-%d')
 		end   = date(end_year, 12, 31).strftime('%Y-%m-%d')
 
@@ -93,6 +101,9 @@ class App:
 		return ts_uri
 
 	def __add_birth_event( self, entity ):
+		from rdflib import URIRef
+		from rdflib.namespace import RDF
+
 		birth_uri = URIRef(self.odnb_events["birth_" + entity["article_id"]])
 		self.graph.add((birth_uri, RDF.type, self.crm.E67_Birth))
 		self.graph.add((birth_uri, self.crm.P98_brought_into_life, entity["uri"]))
@@ -101,6 +112,9 @@ class App:
 		self.graph.add((birth_uri, self.crm["P4_has_time-span"], ts))
 
 	def __add_death_event( self, entity ):
+		from rdflib import URIRef
+		from rdflib.namespace import RDF
+
 		death_uri = URIRef(self.odnb_events["death_" + entity["article_id"]])
 		self.graph.add((death_uri, RDF.type, self.crm.E69_Death))
 		self.graph.add((death_uri, self.crm.P100_was_death_of, entity["uri"]))
@@ -109,6 +123,9 @@ class App:
 		self.graph.add((death_uri, self.crm["P4_has_time-span"], ts))
 
 	def __add_floruit_event( self, entity ):
+		from rdflib import URIRef
+		from rdflib.namespace import RDF
+
 		floruit_uri = URIRef(self.odnb_events["period_" + entity["article_id"]])
 		self.graph.add((floruit_uri, RDF.type, self.crm.E4_Period))
 		self.graph.add((entity["uri"], self.crm.P12_occurred_in_the_presence_of, floruit_uri))
@@ -117,6 +134,8 @@ class App:
 		self.graph.add((floruit_uri, self.crm["P4_has_time-span"], ts))
 
 	def __add_to_graph(self, entity):
+		from rdflib import Literal
+		from rdflib.namespace import RDF, FOAF, RDFS
 		 
 		surname = Literal(entity["surname"])
 		name = Literal(entity["givenName"])
@@ -166,6 +185,8 @@ class App:
 			format=self.options.format)
 
 	def __build_same_as_links(self, external):
+		from rdflib import URIRef
+
 		with open(external, "r") as f:
 			for line in f:
 				entity_id, uri = line.strip().split(" ", 1)